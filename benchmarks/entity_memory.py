@@ -0,0 +1,179 @@
+import argparse
+import gc
+import os
+import random
+import tracemalloc
+
+from benchmarks.harness import clock, environment, write_report
+
+# keep pygame's import banner out of the JSON on stdout
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+
+class FreeList:
+    # the pooling alternative, kept here to be measured: dead instances are
+    # re-initialized instead of freed
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            obj.__init__(*args)
+            return obj
+        return self.cls(*args)
+
+    def release(self, obj):
+        self.free.append(obj)
+
+
+def with_dict(cls):
+    # the same class as it was before __slots__: identical methods, but
+    # every instance carries a __dict__
+    namespace = {
+        k: v for k, v in vars(cls).items()
+        if k not in ("__slots__", "__dict__", "__weakref__") and k not in cls.__slots__
+    }
+    return type(cls.__name__ + "WithDict", (), namespace)
+
+
+def entity_classes():
+    import circle_game
+    import hitnpc
+    from games.bullet import Bullet
+    from games.characters import NPC, Player
+
+    rng = random.Random(1)
+    return {
+        "games.characters.Player": (Player, lambda i: (i, rng.random(), rng.random())),
+        "games.characters.NPC": (NPC, lambda i: (rng.random(), rng.random())),
+        "games.bullet.Bullet": (Bullet, lambda i: (rng.random(), rng.random(), 1, 1)),
+        "hitnpc.NPC": (hitnpc.NPC, lambda i: (rng.random(), rng.random())),
+        "hitnpc.Bullet": (hitnpc.Bullet, lambda i: (rng.random(), rng.random(), 0.5)),
+        "circle_game.NPC": (circle_game.NPC, lambda i: (rng.random(), rng.random())),
+        "circle_game.Bullet": (circle_game.Bullet, lambda i: (rng.random(), rng.random(), 0.5)),
+    }
+
+
+def bytes_per_entity(cls, args, count):
+    # float attributes are allocated either way; what differs is the
+    # instance itself plus its __dict__
+    arg_lists = [args(i) for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        objs = [cls(*a) for a in arg_lists]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objs
+    return (after - before) / count
+
+
+def full_collection_ms(cls, args, count):
+    # a full collection has to visit every live entity
+    objs = [cls(*args(i)) for i in range(count)]
+    gc.collect()
+    start = clock()
+    gc.collect()
+    elapsed = clock() - start
+    del objs
+    return elapsed * 1000
+
+
+class GCTimer:
+    def __init__(self):
+        self.pauses = []
+        self.started = None
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self.started = clock()
+        else:
+            self.pauses.append(clock() - self.started)
+
+    def __enter__(self):
+        gc.collect()
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self)
+
+    def summary(self):
+        return {
+            "gc_collections": len(self.pauses),
+            "gc_pause_total_ms": sum(self.pauses) * 1000,
+            "gc_pause_max_ms": max(self.pauses, default=0.0) * 1000,
+        }
+
+
+def grow(cls, args, count):
+    # spawning a crowd: allocations outrun frees, so the collector runs and
+    # its older generations have to walk everything spawned so far
+    arg_lists = [args(i) for i in range(count)]
+    with GCTimer() as timer:
+        start = clock()
+        objs = [cls(*a) for a in arg_lists]
+        total = clock() - start
+    del objs
+    return {"ms": total * 1000, **timer.summary()}
+
+
+def churn(cls, args, live, ticks, per_tick, pooled):
+    # a steady population where per_tick entities die and are replaced each
+    # tick, like bullets leaving the field while the trigger is held
+    pool = FreeList(cls) if pooled else None
+    make = pool.acquire if pooled else cls
+    objs = [make(*args(i)) for i in range(live)]
+    arg_lists = [args(i) for i in range(per_tick)]
+
+    with GCTimer() as timer:
+        start = clock()
+        for t in range(ticks):
+            base = (t * per_tick) % live
+            for j in range(per_tick):
+                i = (base + j) % live
+                if pooled:
+                    pool.release(objs[i])
+                objs[i] = make(*arg_lists[j])
+        total = clock() - start
+    return {"ms_per_tick": total / ticks * 1000, **timer.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="entity memory and GC cost")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--churn-ticks", type=int, default=600)
+    parser.add_argument("--churn-per-tick", type=int, default=500)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    for name, (cls, make_args) in entity_classes().items():
+        plain = with_dict(cls)
+        result = {"entity": name, "count": args.count}
+        for label, variant in (("dict", plain), ("slots", cls)):
+            result[f"{label}_bytes_per_entity"] = bytes_per_entity(variant, make_args, args.count)
+            result[f"{label}_full_gc_ms"] = full_collection_ms(variant, make_args, args.count)
+            result[f"{label}_grow"] = grow(variant, make_args, args.count)
+        result["churn"] = {
+            label: churn(variant, make_args, args.count, args.churn_ticks,
+                         args.churn_per_tick, pooled)
+            for label, variant, pooled in (("dict", plain, False),
+                                           ("slots", cls, False),
+                                           ("slots_pooled", cls, True))
+        }
+        results.append(result)
+
+    write_report({
+        "benchmark": "entity_memory",
+        "environment": environment(),
+        "results": results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
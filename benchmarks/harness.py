@@ -0,0 +1,102 @@
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+clock = time.perf_counter
+
+
+class StubGraphics:
+    # stands in for the pygame engines: a fixed dt and no-op drawing
+    def __init__(self, dt=1 / 60):
+        self.dt = dt
+
+    def __getattr__(self, name):
+        if name.startswith(("draw_", "render_", "start_", "show_")):
+            return lambda *args, **kwargs: None
+        raise AttributeError(name)
+
+
+class ScriptedInput:
+    # replays a fixed cycle of games.keys bitmasks, one per tick
+    def __init__(self, script):
+        self.script = list(script)
+        self.i = 0
+
+    def get_pressed_keys(self):
+        keys = self.script[self.i % len(self.script)]
+        self.i += 1
+        return keys
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def time_ticks(step, ticks, warmup=30):
+    for _ in range(warmup):
+        step()
+
+    durations = []
+    gc.collect()
+    start = clock()
+    for _ in range(ticks):
+        t = clock()
+        step()
+        durations.append(clock() - t)
+    total = clock() - start
+
+    durations.sort()
+    return {
+        "ticks": ticks,
+        "ticks_per_sec": ticks / total if total else 0.0,
+        "mean_ms": total / ticks * 1000,
+        "p50_ms": percentile(durations, 0.50) * 1000,
+        "p90_ms": percentile(durations, 0.90) * 1000,
+        "p99_ms": percentile(durations, 0.99) * 1000,
+        "max_ms": durations[-1] * 1000,
+    }
+
+
+def peak_memory(build, ticks):
+    # separate pass: tracemalloc slows everything down, so it never
+    # overlaps with the timed run
+    gc.collect()
+    tracemalloc.start()
+    try:
+        step = build()
+        for _ in range(ticks):
+            step()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def environment():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        rev = None
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "git_rev": rev,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
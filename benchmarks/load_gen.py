@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import struct
+import sys
+import time
+
+from benchmarks.harness import environment, percentile, write_report
+from games.keys import DOWN, LEFT, RIGHT, UP
+from games.protocol import (
+    MSG_SNAPSHOT, NO_ACK, FrameDecoder, encode_ack, encode_actions, message_type,
+)
+from games.snapshot import SELF, SnapshotDecoder
+
+clock = time.perf_counter
+
+MOVES = [0, LEFT, RIGHT, UP, DOWN, LEFT | UP, RIGHT | DOWN, LEFT | DOWN, RIGHT | UP]
+
+# the tick sits right after the body flags, so acking needs no full decode
+TICK = struct.Struct("<I")
+TICK_OFFSET = SELF.size + 1
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.gaps = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.msgs_in = 0
+        self.msgs_out = 0
+        self.disconnects = 0
+        self.connect_failures = 0
+
+    def merge(self, other):
+        self.latencies += other.latencies
+        self.gaps += other.gaps
+        for name in ("bytes_in", "bytes_out", "msgs_in", "msgs_out",
+                     "disconnects", "connect_failures"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class LoadClient:
+    def __init__(self, host, port, rate, push, decode, seed, ack_interval=0.25):
+        self.host = host
+        self.port = port
+        self.interval = 1 / rate
+        self.push = push
+        self.decoder = SnapshotDecoder() if decode else None
+        self.rng = random.Random(seed)
+        self.keys = 0
+        self.ack = NO_ACK
+        self.ack_interval = ack_interval
+        self.seq = 0
+        self.sent_keys = None
+        self.sent_ack = None
+        self.ack_sent_at = 0.0
+
+    def next_keys(self):
+        # hold a direction for a while, like a person would
+        if self.rng.random() < 0.1:
+            self.keys = self.rng.choice(MOVES)
+        return self.keys
+
+    def next_message(self, now):
+        # like client.net_game_cli: input only when it changes, otherwise an
+        # ack (every time in request mode, now and then when pushed to)
+        keys = self.next_keys()
+        if keys != self.sent_keys:
+            self.seq += 1
+            self.sent_keys, self.sent_ack, self.ack_sent_at = keys, self.ack, now
+            return encode_actions(self.seq, 0, keys, self.ack)
+        if not self.push or (self.ack != self.sent_ack and
+                             (self.ack == NO_ACK or now - self.ack_sent_at >= self.ack_interval)):
+            self.sent_ack, self.ack_sent_at = self.ack, now
+            return encode_ack(self.ack)
+        return None
+
+    def on_frame(self, payload, stats):
+        stats.msgs_in += 1
+        if self.decoder is not None:
+            state = self.decoder.decode(payload)
+            self.ack = NO_ACK if state is None else state["tick"]
+        else:
+            (self.ack,) = TICK.unpack_from(payload, TICK_OFFSET)
+
+    async def run(self, deadline, stats):
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            stats.connect_failures += 1
+            return
+
+        frames = FrameDecoder()
+
+        async def read_frame():
+            while True:
+                payload = frames.next_frame()
+                while payload is not None:
+                    # server.rooms sends a room notice first; only snapshots count
+                    if message_type(payload) == MSG_SNAPSHOT:
+                        return payload
+                    payload = frames.next_frame()
+                data = await reader.read(64 * 1024)
+                if not data:
+                    raise ConnectionResetError
+                stats.bytes_in += len(data)
+                frames.feed(data)
+
+        async def push_reader():
+            last = None
+            while True:
+                payload = await read_frame()
+                now = clock()
+                if last is not None:
+                    stats.gaps.append(now - last)
+                last = now
+                self.on_frame(payload, stats)
+
+        reader_task = asyncio.create_task(push_reader()) if self.push else None
+        try:
+            next_send = clock() + self.rng.random() * self.interval
+            while clock() < deadline:
+                await asyncio.sleep(max(0.0, next_send - clock()))
+                next_send += self.interval
+
+                sent = clock()
+                data = self.next_message(sent)
+                if data is None:
+                    if reader_task.done():
+                        reader_task.result()
+                    continue
+                writer.write(data)
+                await writer.drain()
+                stats.bytes_out += len(data)
+                stats.msgs_out += 1
+
+                if reader_task is None:
+                    self.on_frame(await read_frame(), stats)
+                    stats.latencies.append(clock() - sent)
+                elif reader_task.done():
+                    reader_task.result()
+        except (ConnectionError, OSError):
+            stats.disconnects += 1
+        finally:
+            if reader_task is not None:
+                reader_task.cancel()
+            writer.close()
+
+
+async def run_clients(host, port, count, duration, rate, push, decode, seed, ack_interval):
+    stats = Stats()
+    deadline = clock() + duration
+    await asyncio.gather(*[
+        LoadClient(host, port, rate, push, decode, seed + i, ack_interval).run(deadline, stats)
+        for i in range(count)
+    ])
+    return stats
+
+
+def worker(job):
+    return asyncio.run(run_clients(*job))
+
+
+def run_step(args, clients, pool):
+    per_proc = [clients // args.procs + (i < clients % args.procs) for i in range(args.procs)]
+    jobs = [(args.host, args.port, n, args.duration, args.rate, args.push,
+             args.decode, args.seed + 100000 * i, args.ack_interval)
+            for i, n in enumerate(per_proc) if n]
+
+    stats = Stats()
+    for s in pool.map(worker, jobs):
+        stats.merge(s)
+
+    latencies = sorted(stats.latencies)
+    gaps = sorted(stats.gaps)
+    result = {
+        "clients": clients,
+        "duration_s": args.duration,
+        "msgs_out_per_sec": stats.msgs_out / args.duration,
+        "msgs_in_per_sec": stats.msgs_in / args.duration,
+        "bytes_out_per_sec": stats.bytes_out / args.duration,
+        "bytes_in_per_sec": stats.bytes_in / args.duration,
+        "disconnects": stats.disconnects,
+        "connect_failures": stats.connect_failures,
+    }
+    if latencies:
+        result.update({
+            "rtt_p50_ms": percentile(latencies, 0.50) * 1000,
+            "rtt_p90_ms": percentile(latencies, 0.90) * 1000,
+            "rtt_p99_ms": percentile(latencies, 0.99) * 1000,
+            "rtt_max_ms": latencies[-1] * 1000,
+        })
+    if gaps:
+        result.update({
+            "gap_p50_ms": percentile(gaps, 0.50) * 1000,
+            "gap_p99_ms": percentile(gaps, 0.99) * 1000,
+        })
+    return result
+
+
+def slo_broken(args, result):
+    if result["disconnects"] or result["connect_failures"]:
+        return "disconnects"
+    if args.push:
+        # snapshots are due every 1/send_rate; the SLO is on lateness past that
+        p99 = result.get("gap_p99_ms")
+        limit = args.slo_p99_ms + 1000 / args.send_rate
+    else:
+        p99 = result.get("rtt_p99_ms")
+        limit = args.slo_p99_ms
+    if p99 is None or p99 > limit:
+        return "p99"
+    expected = result["clients"] * (args.send_rate if args.push else args.rate)
+    if result["msgs_in_per_sec"] < expected * args.slo_delivery:
+        return "delivery"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="load test for server/net_game_serv.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=21002)
+    parser.add_argument("--push", action="store_true",
+                        help="server runs with --push; measure snapshot gaps instead of rtt")
+    parser.add_argument("--send-rate", type=float, default=20,
+                        help="the server's --send-rate, for the delivery SLO in --push mode")
+    parser.add_argument("--rate", type=float, default=20,
+                        help="input polls per second per client; only changes are sent")
+    parser.add_argument("--ack-interval", type=float, default=0.25,
+                        help="in --push mode, seconds between acks while input is unchanged")
+    parser.add_argument("--start", type=int, default=50)
+    parser.add_argument("--step", type=int, default=50)
+    parser.add_argument("--max", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per step")
+    parser.add_argument("--procs", type=int, default=max(1, multiprocessing.cpu_count() // 2),
+                        help="generator processes (keep them off the server's core)")
+    parser.add_argument("--decode", action="store_true",
+                        help="fully decode every snapshot instead of just reading its tick")
+    parser.add_argument("--slo-p99-ms", type=float, default=50)
+    parser.add_argument("--slo-delivery", type=float, default=0.95,
+                        help="fraction of expected replies/snapshots that must arrive")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    steps = []
+    ceiling = None
+    broken = None
+    with multiprocessing.Pool(args.procs) as pool:
+        clients = args.start
+        while clients <= args.max:
+            result = run_step(args, clients, pool)
+            broken = slo_broken(args, result)
+            result["slo_ok"] = broken is None
+            steps.append(result)
+            print(f"[LOAD] {clients} clients: "
+                  f"{'ok' if broken is None else 'SLO broken (' + broken + ')'}",
+                  file=sys.stderr, flush=True)
+            if broken is not None:
+                break
+            ceiling = clients
+            clients += args.step
+
+    write_report({
+        "benchmark": "load",
+        "environment": environment(),
+        "mode": "push" if args.push else "request/response",
+        "slo": {"p99_ms": args.slo_p99_ms, "delivery": args.slo_delivery},
+        "ceiling_clients": ceiling,
+        "stopped_by": broken,
+        "steps": steps,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import itertools
+import math
+import os
+import random
+
+from benchmarks.harness import (ScriptedInput, StubGraphics, environment,
+                                peak_memory, time_ticks, write_report)
+from games.keys import DOWN, FIRE, LEFT, RIGHT, ROTATE_LEFT, ROTATE_RIGHT, UP
+
+# keep pygame's import banner out of the JSON on stdout
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+# keys held on successive ticks; cycles forever
+SCRIPT = [
+    RIGHT | FIRE, RIGHT | DOWN, DOWN | ROTATE_RIGHT | FIRE, LEFT | DOWN,
+    LEFT | ROTATE_LEFT | FIRE, UP, UP | RIGHT | FIRE, 0,
+]
+SERVER_SCRIPT = [RIGHT, RIGHT | DOWN, DOWN, 0, LEFT, LEFT | UP, UP, 0]
+
+
+def build_hitnpc(players, npcs, bullets, seed):
+    import hitnpc
+
+    random.seed(seed)   # hitnpc.NPC draws its speed from the global RNG
+    rng = random.Random(seed)
+    field = hitnpc.GameField(0, 0, 1280, 720)
+    engine = hitnpc.GameEngine(StubGraphics(), ScriptedInput(SCRIPT), field,
+                               hitnpc.Player(640, 360))
+
+    def step():
+        # keep the population steady, like a player who keeps clicking
+        while len(engine.npcs) < npcs:
+            engine.npcs.append(hitnpc.NPC(rng.uniform(0, 1280), rng.uniform(0, 720)))
+        while len(engine.bullets) < bullets:
+            engine.bullets.append(hitnpc.Bullet(rng.uniform(0, 1280), rng.uniform(0, 720),
+                                                rng.uniform(0, 2 * math.pi)))
+        engine.update(engine.input.get_pressed_keys())
+
+    return step
+
+
+def build_circle(players, npcs, bullets, seed):
+    import circle_game
+
+    rng = random.Random(seed)
+    field = circle_game.GameField(0, 0, 1280, 720)
+
+    def new_npc():
+        return circle_game.NPC(rng.uniform(0, 1280), rng.uniform(0, 720),
+                               rng.randint(-200, 200), rng.randint(-200, 200))
+
+    engine = circle_game.GameEngine(StubGraphics(), ScriptedInput(SCRIPT), field,
+                                    circle_game.Player(640, 360), [])
+
+    def step():
+        while len(engine.npcs) < npcs:
+            engine.npcs.append(new_npc())
+        while len(engine.bullets) < bullets:
+            engine.bullets.append(circle_game.Bullet(rng.uniform(0, 1280), rng.uniform(0, 720),
+                                                     rng.uniform(0, 2 * math.pi)))
+        engine.update_state(engine.input_controller.get_pressed_keys())
+
+    return step
+
+
+def build_server(players, npcs, bullets, seed, npc_store=False):
+    from games.characters import NPC, Player
+    from games.game_field import GameField
+    from server.server_game_engine import ServerGameEngine
+
+    rng = random.Random(seed)
+    field = GameField(0, 0, 600, 600)
+    npc_list = [NPC(rng.uniform(0, 600), rng.uniform(0, 600),
+                    rng.randint(-4, 4), rng.randint(-4, 4)) for _ in range(npcs)]
+    if npc_store:
+        from games.npc_store import NPCStore
+        npc_list = NPCStore.from_npcs(npc_list)
+    engine = ServerGameEngine(
+        field,
+        [Player(i, rng.uniform(0, 600), rng.uniform(0, 600)) for i in range(players)],
+        npc_list,
+    )
+    ticks = itertools.count()
+
+    def step():
+        tick = next(ticks)
+        for i in range(players):
+            engine.queue_input(i, tick + 1, tick, SERVER_SCRIPT[(tick + i) % len(SERVER_SCRIPT)])
+        engine.update_state()
+
+    return step
+
+
+def build_server_store(players, npcs, bullets, seed):
+    return build_server(players, npcs, bullets, seed, npc_store=True)
+
+
+ENGINES = {
+    "hitnpc": (build_hitnpc, False, True),          # (builder, multiplayer, bullets)
+    "circle": (build_circle, False, True),
+    "server": (build_server, True, False),
+    "server-store": (build_server_store, True, False),
+}
+
+
+def int_list(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+def cases(engines, players, npcs, bullets):
+    for name in engines:
+        _, multiplayer, has_bullets = ENGINES[name]
+        seen = set()
+        for p, n, b in itertools.product(players, npcs, bullets):
+            case = (p if multiplayer else 1, n, b if has_bullets else 0)
+            if case not in seen:
+                seen.add(case)
+                yield (name,) + case
+
+
+def main():
+    parser = argparse.ArgumentParser(description="headless simulation benchmarks")
+    parser.add_argument("--engines", default=",".join(ENGINES),
+                        help=f"comma separated, from: {', '.join(ENGINES)}")
+    parser.add_argument("--players", type=int_list, default=[1, 100])
+    parser.add_argument("--npcs", type=int_list, default=[100, 1000])
+    parser.add_argument("--bullets", type=int_list, default=[0, 100])
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--memory-ticks", type=int, default=30,
+                        help="ticks to run under tracemalloc (0 skips memory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    engines = [e for e in args.engines.split(",") if e]
+    for name in engines:
+        if name not in ENGINES:
+            parser.error(f"unknown engine {name!r}")
+
+    results = []
+    for name, players, npcs, bullets in cases(engines, args.players, args.npcs, args.bullets):
+        build = ENGINES[name][0]
+        result = {"engine": name, "players": players, "npcs": npcs, "bullets": bullets}
+        result.update(time_ticks(build(players, npcs, bullets, args.seed),
+                                 args.ticks, args.warmup))
+        if args.memory_ticks:
+            result["peak_bytes"] = peak_memory(
+                lambda: build(players, npcs, bullets, args.seed), args.memory_ticks)
+        results.append(result)
+
+    write_report({"benchmark": "simulation", "environment": environment(),
+                  "dt": 1 / 60, "seed": args.seed, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,34 @@
+import argparse
 import time
 import pygame
 import math
 import random
 
+from games.sort_and_sweep import SortAndSweep
+from games.keys import (DOWN, FIRE, LEFT, QUIT, RIGHT, ROTATE_LEFT, ROTATE_RIGHT, UP,
+                        axis)
+from games.spatial_hash import SpatialHash
+from games.sprites import SpriteCache
+
 #INPUT
 class KBPoller:
+    # fills self.pressed with a games.keys bitmask
+    KEYMAP = (
+        (pygame.K_a, LEFT), (pygame.K_d, RIGHT), (pygame.K_w, UP), (pygame.K_s, DOWN),
+        (pygame.K_q, QUIT), (pygame.K_LEFT, ROTATE_LEFT), (pygame.K_RIGHT, ROTATE_RIGHT),
+        (pygame.K_SPACE, FIRE),
+    )
+
     def __init__(self):
-        self.pressed = set()
+        self.pressed = 0
 
     def poll(self):
         keys = pygame.key.get_pressed()
-        self.pressed.clear()
-
-        if keys[pygame.K_a]:
-            self.pressed.add("a")
-        if keys[pygame.K_d]:
-            self.pressed.add("d")
-        if keys[pygame.K_w]:
-            self.pressed.add("w")
-        if keys[pygame.K_s]:
-            self.pressed.add("s")
-        if keys[pygame.K_q]:
-            self.pressed.add("q")
-        if keys[pygame.K_LEFT]:
-            self.pressed.add("left")
-        if keys[pygame.K_RIGHT]:
-            self.pressed.add("right")
-        if keys[pygame.K_SPACE]:
-            self.pressed.add("fire")
+        pressed = 0
+        for key, bit in self.KEYMAP:
+            if keys[key]:
+                pressed |= bit
+        self.pressed = pressed
 
 
 class InputController:
@@ -57,6 +58,8 @@ class GameField:
 
 
 class Player:
+    __slots__ = ("x", "y", "speed_x", "speed_y", "angle", "rot_speed")
+
     def __init__(self, x, y, speed_x=300, speed_y=300):
         self.x = x
         self.y = y
@@ -65,19 +68,21 @@ class Player:
         self.angle = 0.0
         self.rot_speed = 3.0
 
-    def move(self, left, right, up, down, game_field, dt):
-        self.x += self.speed_x * dt * (right - left)
-        self.y += self.speed_y * dt * (down - up)
+    def move(self, keys, game_field, dt):
+        self.x += self.speed_x * dt * axis(keys, LEFT, RIGHT)
+        self.y += self.speed_y * dt * axis(keys, UP, DOWN)
         self.x, self.y, _, _ = game_field.clamp(self.x, self.y)
 
-    def rotate(self, left, right, dt):
-        self.angle += self.rot_speed * dt * (right - left)
+    def rotate(self, keys, dt):
+        self.angle += self.rot_speed * dt * axis(keys, ROTATE_LEFT, ROTATE_RIGHT)
 
     def fire(self):
         return Bullet(self.x, self.y, self.angle)
 
 
 class NPC:
+    __slots__ = ("x", "y", "speed_x", "speed_y", "size")
+
     def __init__(self, x, y, speed_x=2, speed_y=2, size=20):
         self.x = x
         self.y = y
@@ -85,9 +90,9 @@ class NPC:
         self.speed_y = speed_y
         self.size = size
 
-    def move(self, game_field):
-        self.x += self.speed_x
-        self.y += self.speed_y
+    def move(self, game_field, dt):
+        self.x += self.speed_x * dt
+        self.y += self.speed_y * dt
 
         self.x, self.y, hit_x, hit_y = game_field.clamp(self.x, self.y)
 
@@ -106,6 +111,8 @@ class NPC:
 
 
 class Bullet:
+    __slots__ = ("x", "y", "speed", "vx", "vy")
+
     def __init__(self, x, y, angle):
         self.x = x
         self.y = y
@@ -139,57 +146,76 @@ def resolve_collision(a, b, radius):
 
 #GRAPHICS (pygame)
 class GraphicsEngine:
-    def __init__(self):
+    def __init__(self, dirty_rects=False):
         pygame.init()
         self.screen = pygame.display.set_mode((1280, 720))
         pygame.display.set_caption("GameEngine + pygame")
         self.clock = pygame.time.Clock()
+        self.sprites = SpriteCache()
         self.dt = 0
 
+        # only erase/update the areas drawn last frame and this frame
+        self.dirty_rects = dirty_rects
+        self.drawn = []
+        self.last_drawn = None
+
     def start_frame(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
-        self.screen.fill("purple")
+            if event.type in (pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", None)):
+                self.last_drawn = None
+
+        if not self.dirty_rects or self.last_drawn is None:
+            self.screen.fill("purple")
+        else:
+            for rect in self.last_drawn:
+                self.screen.fill("purple", rect)
+        self.drawn = []
 
     def render_circle(self, x, y, radius, color):
-        pygame.draw.circle(
-            self.screen,
-            pygame.Color(color),
-            (int(x), int(y)),
-            radius
+        sprite = self.sprites.circle(radius, color)
+        self.drawn.append(self.screen.blit(sprite, (x - radius, y - radius)))
+
+    def render_circles(self, points, radius, color):
+        rects = self.sprites.blit_circles(
+            self.screen, points, radius, color, doreturn=self.dirty_rects
         )
+        if rects:
+            self.drawn.extend(rects)
 
     def draw_player(self, player):
-        pygame.draw.circle(
+        self.drawn.append(pygame.draw.circle(
             self.screen,
             "red",
             (int(player.x), int(player.y)),
             40
-        )
+        ))
 
         end_x = player.x + math.cos(player.angle) * 50
         end_y = player.y + math.sin(player.angle) * 50
 
-        pygame.draw.line(
+        self.drawn.append(pygame.draw.line(
             self.screen,
             "white",
             (player.x, player.y),
             (end_x, end_y),
             4
-        )
+        ))
 
     def draw_bullet(self, bullet):
-        pygame.draw.circle(
-            self.screen,
-            "yellow",
-            (int(bullet.x), int(bullet.y)),
-            6
-        )
+        self.render_circle(bullet.x, bullet.y, 6, "yellow")
+
+    def draw_bullets(self, bullets):
+        self.render_circles([(b.x, b.y) for b in bullets], 6, "yellow")
 
     def show_frame(self):
-        pygame.display.flip()
+        if not self.dirty_rects or self.last_drawn is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.last_drawn + self.drawn)
+        self.last_drawn = self.drawn
         self.dt = self.clock.tick(60) / 1000
 
 
@@ -202,56 +228,72 @@ class GameEngine:
         self.player = player
         self.npcs = npc
         self.bullets = []
+        self.npc_grid = SpatialHash(game_field, 40)
+        self.npc_sweep = SortAndSweep()
         self.running = True
 
     def update_state(self, pressed_keys):
         for npc in self.npcs:
             npc.move(self.game_field, self.graph_engine.dt)
+        self.collide_npcs()
 
-        self.player.move(
-            "a" in pressed_keys,
-            "d" in pressed_keys,
-            "w" in pressed_keys,
-            "s" in pressed_keys,
-            self.game_field,
-            self.graph_engine.dt,
-        )
+        self.player.move(pressed_keys, self.game_field, self.graph_engine.dt)
+        self.player.rotate(pressed_keys, self.graph_engine.dt)
 
-        self.player.rotate(
-            "left" in pressed_keys,
-            "right" in pressed_keys,
-            self.graph_engine.dt,
-        )
-
-        if "fire" in pressed_keys:
+        if pressed_keys & FIRE:
             self.bullets.append(self.player.fire())
 
-        for bullet in self.bullets[:]:
+        for bullet in self.bullets:
             bullet.move(self.graph_engine.dt)
 
-            if bullet.x < 0 or bullet.x > 1280 or bullet.y < 0 or bullet.y > 720:
-                self.bullets.remove(bullet)
+        self.bullets = [
+            b for b in self.bullets
+            if not (b.x < 0 or b.x > 1280 or b.y < 0 or b.y > 720)
+        ]
 
-        for bullet in self.bullets[:]:
-            for npc in self.npcs[:]:
-                if math.hypot(bullet.x - npc.x, bullet.y - npc.y) < 40:
-                    self.bullets.remove(bullet)
-                    self.npcs.remove(npc)
-                    break
+        self.hit_npcs(40)
 
-        if "q" in pressed_keys:
+        if pressed_keys & QUIT:
             self.running = False
 
+    def collide_npcs(self):
+        # only pairs whose bounding boxes overlap get the exact test
+        for a, b in self.npc_sweep.pairs(self.npcs):
+            resolve_collision(a, b, (a.size + b.size) / 4)
+
+    def hit_npcs(self, radius):
+        self.npc_grid.rebuild(self.npcs)
+        dead = set()
+        survivors = []
+
+        for bullet in self.bullets:
+            target = None
+            for i in self.npc_grid.query(bullet.x, bullet.y, radius):
+                if i in dead or (target is not None and i > target):
+                    continue
+                npc = self.npcs[i]
+                if math.hypot(bullet.x - npc.x, bullet.y - npc.y) < radius:
+                    target = i
+
+            if target is None:
+                survivors.append(bullet)
+            else:
+                dead.add(target)
+
+        self.bullets = survivors
+        if dead:
+            self.npcs = [n for i, n in enumerate(self.npcs) if i not in dead]
+
     def render_state(self):
         self.graph_engine.start_frame()
 
         self.graph_engine.draw_player(self.player)
 
-        for npc in self.npcs:
-            self.graph_engine.render_circle(npc.x, npc.y, 40, "blue")
+        self.graph_engine.render_circles(
+            [(npc.x, npc.y) for npc in self.npcs], 40, "blue"
+        )
 
-        for bullet in self.bullets:
-            self.graph_engine.draw_bullet(bullet)
+        self.graph_engine.draw_bullets(self.bullets)
 
         self.graph_engine.show_frame()
 
@@ -264,6 +306,11 @@ class GameEngine:
 
 #MAIN
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and push only the areas that changed")
+    args = parser.parse_args()
+
     game_field = GameField(0, 0, 1280, 720)
 
     player = Player(640, 360)
@@ -276,10 +323,11 @@ if __name__ == "__main__":
                 random.randint(100, 600),
                 random.randint(-200, 200),
                 random.randint(-200, 200),
+                size=80,    # as drawn, so collisions match what is on screen
             )
         )
 
-    graphics = GraphicsEngine()
+    graphics = GraphicsEngine(dirty_rects=args.dirty_rects)
     input_controller = InputController(KBPoller())
 
     game = GameEngine(
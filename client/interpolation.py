@@ -0,0 +1,119 @@
+import time
+from collections import deque
+
+from games.characters import Player
+
+clock = time.perf_counter
+
+
+class ServerClock:
+    # Maps local time to (fractional) server ticks from snapshot arrival times.
+    def __init__(self, fps=60):
+        self.step = 1 / fps
+        self.offset = None
+
+    def observe(self, tick, now):
+        offset = now - tick * self.step
+        # the earliest arrival had the least network delay; drift slowly
+        # towards later arrivals so a route that gets slower is followed
+        if self.offset is None or offset < self.offset:
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * 0.01
+
+    def tick_at(self, now):
+        return (now - self.offset) / self.step
+
+
+def lerp_state(a, b, t):
+    a_players = a["players"]
+    players = {}
+    for pid, (bx, by, score) in b["players"].items():
+        if pid in a_players:
+            ax, ay, _ = a_players[pid]
+            players[pid] = (ax + (bx - ax) * t, ay + (by - ay) * t, score)
+        else:
+            players[pid] = (bx, by, score)
+
+    if "npc_ids" in b:
+        # area-of-interest states: match NPCs by id, ones that just came
+        # into view appear where they are
+        a_npcs = dict(zip(a.get("npc_ids", ()), a["npcs"]))
+        npcs = []
+        for i, (bx, by) in zip(b["npc_ids"], b["npcs"]):
+            if i in a_npcs:
+                ax, ay = a_npcs[i]
+                npcs.append((ax + (bx - ax) * t, ay + (by - ay) * t))
+            else:
+                npcs.append((bx, by))
+    elif len(a["npcs"]) == len(b["npcs"]):
+        npcs = [
+            (ax + (bx - ax) * t, ay + (by - ay) * t)
+            for (ax, ay), (bx, by) in zip(a["npcs"], b["npcs"])
+        ]
+    else:
+        npcs = b["npcs"]
+
+    return {"players": players, "npcs": npcs, "self": b["self"],
+            "tick": a["tick"] + (b["tick"] - a["tick"]) * t}
+
+
+class SnapshotBuffer:
+    def __init__(self, size=32):
+        self.states = deque(maxlen=size)
+
+    def add(self, state):
+        if not self.states or state["tick"] > self.states[-1]["tick"]:
+            self.states.append(state)
+
+    def sample(self, tick):
+        states = self.states
+        if not states:
+            return None
+        if tick <= states[0]["tick"]:
+            return states[0]
+
+        prev = states[0]
+        for state in states:
+            if state["tick"] >= tick:
+                t = (tick - prev["tick"]) / (state["tick"] - prev["tick"])
+                return lerp_state(prev, state, t)
+            prev = state
+
+        # out of data: hold the newest state rather than guess
+        return states[-1]
+
+
+class Predictor:
+    # Runs the local player through the same games.characters.Player.move the
+    # server uses, once per server tick, and replays unacknowledged input on
+    # top of every authoritative position that arrives. Moves are numbered by
+    # client tick; each snapshot says which client tick the server's latest
+    # move for us was.
+    def __init__(self, pid, game_field, speed=4, size=20):
+        self.player = Player(pid, 0, 0, speed, size)
+        self.game_field = game_field
+        self.history = deque()      # (client tick, keys)
+        self.ready = False
+
+    def step(self, tick, keys):
+        self.history.append((tick, keys))
+        if self.ready:
+            self.move(keys)
+
+    def move(self, keys):
+        self.player.move(keys, self.game_field)
+
+    def reconcile(self, x, y, acked):
+        # acked: the client tick of the last move in this position
+        while self.history and self.history[0][0] <= acked:
+            self.history.popleft()
+
+        self.player.x, self.player.y = x, y
+        for _, keys in self.history:
+            self.move(keys)
+        self.ready = True
+
+    @property
+    def position(self):
+        return self.player.x, self.player.y
@@ -1,36 +1,213 @@
+import argparse
+import select
 import socket
 
+from client.interpolation import Predictor, ServerClock, SnapshotBuffer, clock
 from games.graphics_engine import PyGameGraphicsEngine
 from games.input_controller import PyGameInputController
+from games.keys import QUIT, ROOM, WIRE
+from games.protocol import (
+    FRAME_HEADER, MSG_ROOM, NO_ACK, FrameDecoder, decode_room, encode_ack, encode_actions,
+    encode_join, message_type,
+)
+from games.snapshot import SnapshotDecoder
 
 HOST = "127.0.0.1"
 PORT = 21001
 
-s = socket.socket()
-s.connect(("127.0.0.1", 21002))
+parser = argparse.ArgumentParser()
+parser.add_argument("--push", action="store_true",
+                    help="server broadcasts state (start it with --push too)")
+parser.add_argument("--interp-delay", type=float, default=100, metavar="MS",
+                    help="draw other entities this far in the past (0 disables)")
+parser.add_argument("--no-predict", action="store_true",
+                    help="draw our own player where the server last put it")
+parser.add_argument("--ack-interval", type=float, default=0.25, metavar="SECONDS",
+                    help="in --push mode, how often to ack snapshots while input is unchanged")
+parser.add_argument("--server-fps", type=int, default=60)
+parser.add_argument("--dirty-rects", action="store_true",
+                    help="redraw and push only the areas that changed")
+parser.add_argument("--udp", action="store_true",
+                    help="talk to a server started with --mode udp")
+parser.add_argument("--loss", type=float, default=0.0,
+                    help="--udp: drop this fraction of outgoing datagrams")
+parser.add_argument("--latency-ms", type=float, default=0.0,
+                    help="--udp: delay outgoing datagrams this long")
+parser.add_argument("--jitter-ms", type=float, default=0.0,
+                    help="--udp: plus a random extra delay up to this long")
+args = parser.parse_args()
+
+udp = None
+if args.udp:
+    from client.udp_client import UdpClient
+    udp = UdpClient("127.0.0.1", 21002, {"loss": args.loss, "latency": args.latency_ms / 1000,
+                                         "jitter": args.jitter_ms / 1000})
+    udp.connect()
+else:
+    s = socket.socket()
+    s.connect(("127.0.0.1", 21002))
 print("Connected")
 
-gfx = PyGameGraphicsEngine(600, 600)
-inp = PyGameInputController()
+gfx = PyGameGraphicsEngine(600, 600, dirty_rects=args.dirty_rects)
+inp = PyGameInputController(on_expose=gfx.invalidate)
+reader = FrameDecoder()
+snapshots = SnapshotDecoder()
+ack = NO_ACK
+
+server_clock = ServerClock(args.server_fps)
+history = SnapshotBuffer()
+interp_ticks = args.interp_delay / 1000 * args.server_fps
+predictor = None
+predicted_tick = None
+# our ticks are server ticks plus this, once we predict; see Predictor
+tick_offset = None
+
+# input goes up only when it changes; the server holds it until the next one
+seq = 0
+sent_keys = None
+sent_ack = None
+ack_sent_at = 0.0
+
+
+def send(data, reliable=False):
+    # reliable only matters over UDP, where a datagram is a payload, not a frame
+    if udp is not None:
+        udp.send(data[FRAME_HEADER.size:], reliable)
+    else:
+        s.sendall(data)
+
+
+def wait_for_payloads():
+    # UDP: whatever arrives within a frame. Replies can be lost, so even in
+    # request mode we never wait for one in particular
+    if udp is not None:
+        return udp.poll(1 / 60)
+
+    # request/response: exactly one snapshot per input message, plus a room
+    # notice when server.rooms moves us
+    if not args.push:
+        payloads = []
+        while True:
+            payload = reader.read_frame(s)
+            if payload is None:
+                return None
+            payloads.append(payload)
+            if message_type(payload) != MSG_ROOM:
+                return payloads
+
+    # push: wait up to one frame, then take whatever else has arrived
+    timeout = 1 / 60
+    while select.select([s], [], [], timeout)[0]:
+        if reader.recv_from(s) == 0:
+            return None
+        timeout = 0
+    payloads = []
+    while True:
+        payload = reader.next_frame()
+        if payload is None:
+            return payloads
+        payloads.append(payload)
+
 
+state = None
+last_keys = 0
 while True:
     keys = inp.get_pressed_keys()
 
-    if "q" in keys:
+    if keys & QUIT:
         break
 
-    actions = {k: True for k in keys}
-    s.send(str(actions).encode())
+    if keys & ROOM and not last_keys & ROOM:
+        send(encode_join(), reliable=True)
+    last_keys = keys
 
-    state = eval(s.recv(2048).decode())
+    now = clock()
+    if keys & WIRE != sent_keys:
+        # tagged with the first tick the keys apply to: our next predicted one
+        seq += 1
+        tick = 0 if tick_offset is None else predicted_tick + 1 + tick_offset
+        send(encode_actions(seq, tick, keys, ack), reliable=True)
+        sent_keys, sent_ack, ack_sent_at = keys & WIRE, ack, now
+    elif not args.push or (ack != sent_ack and
+                           (ack == NO_ACK or now - ack_sent_at >= args.ack_interval)):
+        # request mode asks for every frame; in push mode acks only keep
+        # delta baselines fresh, apart from asking for a keyframe
+        send(encode_ack(ack))
+        sent_ack, ack_sent_at = ack, now
+
+    payloads = wait_for_payloads()
+    if payloads is None:
+        break
+
+    now = clock()
+    for payload in payloads:
+        if message_type(payload) == MSG_ROOM:
+            # a different world: its ticks and baselines have nothing to do
+            # with what we have
+            print(f"In room {decode_room(payload)}")
+            snapshots = SnapshotDecoder()
+            ack = NO_ACK
+            server_clock = ServerClock(args.server_fps)
+            history = SnapshotBuffer()
+            predictor = None
+            predicted_tick = None
+            tick_offset = None
+            # the new room has never seen our input
+            sent_keys = None
+            state = None
+            continue
+
+        new_state = snapshots.decode(payload)
+        if new_state is None:
+            # missing delta baseline: NO_ACK makes the server send a keyframe
+            ack = NO_ACK
+            continue
+        state = new_state
+        ack = state["tick"]
+
+        server_clock.observe(state["tick"], now)
+        history.add(state)
+
+        if not args.no_predict and state["self"] in state["players"]:
+            if predictor is None:
+                predictor = Predictor(state["self"], snapshots.quantizer.game_field)
+            x, y, _ = state["players"][state["self"]]
+            predictor.reconcile(x, y, state["input_tick"])
+
+    if state is None:
+        continue
+
+    server_tick = server_clock.tick_at(now)
+    if predictor is not None:
+        # one predicted move per server tick, numbered in our own ticks. The
+        # server counts each tick it holds our input as our next tick, so
+        # until we send a change the two clocks are a fixed offset apart
+        if predicted_tick is None:
+            predicted_tick = int(server_tick)
+            tick_offset = state["input_tick"] - state["tick"]
+        while predicted_tick < int(server_tick):
+            predicted_tick += 1
+            predictor.step(predicted_tick + tick_offset, keys)
+
+    view = state
+    if interp_ticks > 0:
+        view = history.sample(server_tick - interp_ticks)
 
     gfx.start_frame()
 
-    for pid, (x, y, _) in state["players"].items():
-        color = "green" if pid == state["self"] else "blue"
-        gfx.render_circle(x, y, 10, color)
+    others = []
+    for pid, (x, y, _) in view["players"].items():
+        if pid != view["self"]:
+            others.append((x, y))
+        else:
+            if predictor is not None and predictor.ready:
+                x, y = predictor.position
+            gfx.render_circle(x, y, 10, "green")
+    gfx.render_circles(others, 10, "blue")
 
-    for x, y in state["npcs"]:
-        gfx.render_circle(x, y, 10, "red")
+    gfx.render_circles(view["npcs"], 10, "red")
 
     gfx.show_frame()
+
+if udp is not None:
+    udp.close()
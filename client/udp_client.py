@@ -0,0 +1,121 @@
+import random
+import select
+import socket
+import struct
+import time
+
+from games.protocol import MSG_SNAPSHOT, MSG_WELCOME
+from games.udp import (
+    LinkSimulator, ReliableChannel, decode_packet, decode_welcome, encode_bye, encode_hello,
+    encode_packet, snapshot_tick,
+)
+
+clock = time.perf_counter
+
+
+class UdpClient:
+    # Client end of games.udp on a blocking socket. poll() is the only place
+    # that waits, so it also does the timed work: resending unacked messages
+    # and releasing datagrams the link simulator is holding back.
+    def __init__(self, host, port, link=None, resend=0.05, timeout=5.0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect((host, port))
+        self.sock.setblocking(False)
+        self.addr = (host, port)
+        self.link = LinkSimulator(lambda data, addr: self.sock.send(data), **(link or {}))
+        self.channel = ReliableChannel(resend)
+        self.timeout = timeout
+        self.nonce = random.getrandbits(32)
+        self.token = 0
+        self.pid = None
+        self.latest_tick = None
+        self.stale = 0
+        self.last_heard = clock()
+
+    def connect(self):
+        # hello until welcomed; the server answers every copy the same way
+        deadline = clock() + self.timeout
+        while self.token == 0:
+            if clock() > deadline:
+                raise ConnectionError(f"no answer from {self.addr}")
+            self.link.send(encode_packet(0, payload=encode_hello(self.nonce)), self.addr)
+            self.poll(self.channel.resend)
+        return self.pid
+
+    def send(self, payload, reliable=False):
+        if reliable:
+            self.channel.queue(payload)
+            payload = b""
+        self.link.send(encode_packet(self.token, self.channel, payload), self.addr)
+
+    def close(self, linger=0.5):
+        # tell the server, and give the bye a little while to get through
+        self.send(encode_bye(), reliable=True)
+        deadline = clock() + linger
+        while self.channel.unacked and clock() < deadline:
+            self.poll(deadline - clock())
+        self.sock.close()
+
+    def poll(self, timeout):
+        # Waits up to timeout for something to arrive, then returns the
+        # payloads: reliable ones in order, then fresh snapshots. None once
+        # the server has been silent for self.timeout.
+        deadline = clock() + timeout
+        out = []
+        while True:
+            now = clock()
+            self.link.flush()
+            if self.channel.due(now):
+                self.send(b"")
+
+            wait = deadline - now
+            for due in (self.link.next_due(),
+                        self.channel.resend if self.channel.unacked else None):
+                if due is not None:
+                    wait = min(wait, due)
+            if select.select([self.sock], [], [], max(0.0, wait))[0]:
+                self._receive_all(out)
+
+            if out or clock() >= deadline:
+                break
+        if clock() - self.last_heard > self.timeout:
+            return None
+        return out
+
+    def _receive_all(self, out):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, ConnectionRefusedError):
+                return
+            try:
+                self._receive(data, out)
+            except struct.error:
+                continue
+
+    def _receive(self, data, out):
+        token, ack, messages, payload = decode_packet(data)
+        if self.token == 0:
+            if payload[:1] == bytes((MSG_WELCOME,)):
+                nonce, token, pid = decode_welcome(payload)
+                if nonce == self.nonce:
+                    self.token, self.pid = token, pid
+                    self.last_heard = clock()
+            return
+        if token != self.token:
+            return
+        self.last_heard = clock()
+
+        self.channel.on_ack(ack)
+        for seq, message in messages:
+            out.extend(self.channel.receive(seq, message))
+
+        if payload[:1] == bytes((MSG_SNAPSHOT,)):
+            # unreliable and sequenced: anything not newer than what we have
+            # is a duplicate or arrived out of order, and is of no use
+            tick = snapshot_tick(payload)
+            if self.latest_tick is not None and tick <= self.latest_tick:
+                self.stale += 1
+                return
+            self.latest_tick = tick
+            out.append(payload)
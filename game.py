@@ -1,4 +1,5 @@
 from pynput import keyboard
+import threading
 import time
 from player import Player
 from npc import NPC
@@ -10,19 +11,39 @@ class KBPoller:
     def on_press(self, key):
         try:
             ch = key.char.lower()
-            self.pressed.add(ch)
         except AttributeError:
-            pass
+            return
+        with self.changed:
+            # key auto-repeat presses again; only a new key is news
+            if ch not in self.pressed:
+                self.pressed.add(ch)
+                self.dirty = True
+                self.changed.notify_all()
 
     def on_release(self, key):
         try:
             ch = key.char.lower()
-            self.pressed.remove(ch)
         except AttributeError:
-            pass
+            return
+        with self.changed:
+            if ch in self.pressed:
+                self.pressed.remove(ch)
+                self.dirty = True
+                self.changed.notify_all()
+
+    def wait(self, timeout):
+        # blocks until the pressed keys change or timeout runs out; returns a
+        # copy of the pressed keys and whether they changed since last time
+        with self.changed:
+            if not self.dirty and timeout > 0:
+                self.changed.wait(timeout)
+            dirty, self.dirty = self.dirty, False
+            return set(self.pressed), dirty
 
     def __init__(self):
         self.pressed = set()
+        self.changed = threading.Condition()
+        self.dirty = False
 
         listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
         listener.start()
@@ -42,10 +63,9 @@ x_max = 100
 y_min = 0
 y_max = 100
 
-kb = KBPoller()
+STEP = 0.1
 
-def scan_keys():
-    return kb.pressed
+kb = KBPoller()
 
 def render_state():
     print("player is at:", player_x, player_y , "| npc is at:", npc_x, npc_y)
@@ -93,20 +113,34 @@ def update_npc():
         npc_y = y_max
         npc_vy = -npc_vy
 
+clock = time.perf_counter
+keys = set()
+next_npc = next_player = clock()
+
 while running:
-    # read/check for user actions (input)
-    # update game state (physics, AI, etc)
-    # render game state (graphics)
-
-    render_state()
-    keys = scan_keys()
-
-    update_state(keys)
-    update_npc()
-<<<<<<< HEAD
-
-    time.sleep(0.1)
-=======
-    
-    time.sleep(0.1)
->>>>>>> ec35cc4d9528b74304a9678ec70a1570f5f278c1
+    # wake up on input or when the next step is due, whichever is first:
+    # a new key press acts immediately, held keys repeat once per step and
+    # the npc moves once per step
+
+    now = clock()
+    changed = False
+    if keys and now >= next_player:
+        update_state(keys)
+        next_player = now + STEP
+        changed = True
+    if now >= next_npc:
+        update_npc()
+        next_npc += STEP
+        if next_npc < now:
+            # fell behind (e.g. a slow terminal): skip, don't burst
+            next_npc = now + STEP
+        changed = True
+
+    if changed:
+        render_state()
+
+    deadline = min(next_npc, next_player) if keys else next_npc
+    pressed, new_input = kb.wait(deadline - clock())
+    if new_input and pressed - keys:
+        next_player = clock()
+    keys = pressed
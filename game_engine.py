@@ -3,7 +3,7 @@ import time
 from pynput import keyboard
 
 class GameEngine:
-    def __init__(self, player, npcs, graphics, poller, x_max=20, y_max=10):
+    def __init__(self, player, npcs, graphics, poller, x_max=20, y_max=10, step=0.1):
         self.player = player
         self.npcs = npcs
         self.graphics = graphics
@@ -11,6 +11,7 @@ class GameEngine:
         self.running = True
         self.x_max = x_max
         self.y_max = y_max
+        self.step = step
 
     def update_player(self):
         p = self.poller.pressed
@@ -26,9 +27,32 @@ class GameEngine:
             self.running = False
 
     def run(self):
+        # Sleeps until the poller reports a change in the pressed keys or the
+        # next step is due. A fresh key press is handled at once; held keys
+        # then repeat once per step, and NPCs keep their own step schedule.
+        clock = time.perf_counter
+        step = self.step
+        keys = set()
+        next_npc = next_player = clock()
         while self.running:
-            self.update_player()
-            for npc in self.npcs:
-                npc.update(self.x_max, self.y_max)
-            self.graphics.render(self.player, self.npcs)
-            time.sleep(0.1)
+            now = clock()
+            changed = False
+            if keys and now >= next_player:
+                self.update_player()
+                next_player = now + step
+                changed = True
+            if now >= next_npc:
+                for npc in self.npcs:
+                    npc.update(self.x_max, self.y_max)
+                next_npc += step
+                if next_npc < now:
+                    next_npc = now + step
+                changed = True
+            if changed:
+                self.graphics.render(self.player, self.npcs)
+
+            deadline = min(next_npc, next_player) if keys else next_npc
+            pressed, new_input = self.poller.wait(deadline - clock())
+            if new_input and pressed - keys:
+                next_player = clock()
+            keys = pressed
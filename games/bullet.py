@@ -1,4 +1,6 @@
 class Bullet:
+    __slots__ = ("x", "y", "speed_x", "speed_y")
+
     def __init__(self, x, y, speed_x, speed_y):
         self.x = x
         self.y = y
@@ -1,4 +1,9 @@
+from games.keys import DOWN, LEFT, RIGHT, UP
+
+
 class Player:
+    __slots__ = ("id", "x", "y", "speed", "size", "score")
+
     def __init__(self, id, x, y, speed=4, size=20):
         self.id = id
         self.x = x
@@ -7,14 +12,15 @@ class Player:
         self.size = size
         self.score = 0
 
-    def move(self, left, right, up, down, rotate, game_field):
-        if left:
+    def move(self, keys, game_field):
+        # keys: a games.keys bitmask
+        if keys & LEFT:
             self.x -= self.speed
-        if right:
+        if keys & RIGHT:
             self.x += self.speed
-        if up:
+        if keys & UP:
             self.y -= self.speed
-        if down:
+        if keys & DOWN:
             self.y += self.speed
 
         self.x, self.y, _, _ = game_field.clamp(self.x, self.y)
@@ -25,6 +31,8 @@ class Player:
 
 
 class NPC:
+    __slots__ = ("x", "y", "speed_x", "speed_y", "size")
+
     def __init__(self, x, y, speed_x=2, speed_y=2, size=20):
         self.x = x
         self.y = y
@@ -1,5 +1,7 @@
 import pygame
 
+from games.sprites import SpriteCache
+
 
 class GraphicsEngine:
     def __init__(self, width, height):
@@ -16,6 +18,10 @@ class GraphicsEngine:
     def render_circle(self, x, y, radius, color):
         print(f"{color} circle is at:", x, y)
 
+    def render_circles(self, points, radius, color):
+        for x, y in points:
+            self.render_circle(x, y, radius, color)
+
     def render_rectangle(self, x, y, width, height, color):
         print(f"{color} rectangle is at:", x, y)
 
@@ -24,22 +30,53 @@ class GraphicsEngine:
 
 
 class PyGameGraphicsEngine(GraphicsEngine):
-    def __init__(self, width, height):
+    def __init__(self, width, height, dirty_rects=False, background="purple"):
         super().__init__(width, height)
         pygame.init()
         self.screen = pygame.display.set_mode((width, height))
+        self.background = pygame.Color(background)
+        self.sprites = SpriteCache()
+        # dirty-rect mode: erase and push only what was drawn last frame and
+        # this frame instead of clearing and flipping the whole surface
+        self.dirty_rects = dirty_rects
+        self.drawn = []
+        self.last_drawn = None
+
+    def invalidate(self):
+        self.last_drawn = None
 
     def start_frame(self):
-        self.screen.fill("purple")
+        if not self.dirty_rects or self.last_drawn is None:
+            self.screen.fill(self.background)
+        else:
+            for rect in self.last_drawn:
+                self.screen.fill(self.background, rect)
+        self.drawn = []
 
     def show_frame(self):
-        pygame.display.flip()
+        if not self.dirty_rects or self.last_drawn is None:
+            pygame.display.flip()
+        else:
+            dirty = self.last_drawn + self.drawn
+            # past about half the screen a single flip is cheaper
+            if sum(r.w * r.h for r in dirty) * 2 > self.width * self.height:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty)
+        self.last_drawn = self.drawn
 
     def render_circle(self, x, y, radius, color):
-        pygame.draw.circle(self.screen, color, (x, y), radius)
+        sprite = self.sprites.circle(radius, color)
+        self.drawn.append(self.screen.blit(sprite, (x - radius, y - radius)))
+
+    def render_circles(self, points, radius, color):
+        rects = self.sprites.blit_circles(self.screen, points, radius, color,
+                                          doreturn=self.dirty_rects)
+        if rects:
+            self.drawn.extend(rects)
 
     def render_rectangle(self, x, y, width, height, color):
-        pygame.draw.rect(self.screen, color, (x, y, width, height))
+        self.drawn.append(pygame.draw.rect(self.screen, color, (x, y, width, height)))
 
     def render_line(self, x1, y1, x2, y2, color):
-        pygame.draw.line(self.screen, color, (x1, y1), (x2, y2))
\ No newline at end of file
+        self.drawn.append(pygame.draw.line(self.screen, color, (x1, y1), (x2, y2)))
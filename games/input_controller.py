@@ -1,21 +1,38 @@
 import pygame
 
+from games.keys import DOWN, LEFT, QUIT, RIGHT, ROOM, UP
+
+
+# the window was uncovered and its contents are gone (pygame 1 and 2 names)
+EXPOSE_EVENTS = {pygame.VIDEOEXPOSE, getattr(pygame, "WINDOWEXPOSED", pygame.VIDEOEXPOSE)}
+
+
 class PyGameInputController:
+    def __init__(self, on_expose=None):
+        # this drains the event queue, so it tells the renderer about exposes,
+        # e.g. PyGameGraphicsEngine.invalidate in dirty-rect mode
+        self.on_expose = on_expose
+
     def get_pressed_keys(self):
-        pressed = set()
+        # returns a games.keys bitmask
+        pressed = 0
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pressed.add("q")
+                pressed |= QUIT
+            elif event.type in EXPOSE_EVENTS and self.on_expose is not None:
+                self.on_expose()
 
         keys = pygame.key.get_pressed()
         if keys[pygame.K_a]:
-            pressed.add("left")
+            pressed |= LEFT
         if keys[pygame.K_d]:
-            pressed.add("right")
+            pressed |= RIGHT
         if keys[pygame.K_w]:
-            pressed.add("up")
+            pressed |= UP
         if keys[pygame.K_s]:
-            pressed.add("down")
+            pressed |= DOWN
+        if keys[pygame.K_n]:
+            pressed |= ROOM
 
         return pressed
@@ -0,0 +1,35 @@
+# Input state is one small int with a bit per action. Pollers build it, it
+# goes over the wire as a single byte (games.protocol.ACTIONS) and the server
+# keeps one per player in a flat array, so nothing on the per-frame input
+# path allocates or hashes.
+LEFT = 1 << 0
+RIGHT = 1 << 1
+UP = 1 << 2
+DOWN = 1 << 3
+QUIT = 1 << 4
+
+# local games only (hitnpc, circle_game)
+FIRE = 1 << 5
+ROTATE_LEFT = 1 << 6
+ROTATE_RIGHT = 1 << 7
+
+# client only: asks for a room change, sent as MSG_JOIN rather than a bit
+ROOM = 1 << 8
+
+# what the server reads; the bit order the protocol has always used
+WIRE = LEFT | RIGHT | UP | DOWN | QUIT
+
+NAMES = {
+    LEFT: "left", RIGHT: "right", UP: "up", DOWN: "down", QUIT: "quit",
+    FIRE: "fire", ROTATE_LEFT: "rotate_left", ROTATE_RIGHT: "rotate_right", ROOM: "room",
+}
+
+
+def names(keys):
+    # for logs and debugging, never the hot path
+    return [name for bit, name in NAMES.items() if keys & bit]
+
+
+def axis(keys, negative, positive):
+    # -1, 0 or 1 along one axis, for movement scaled by speed and dt
+    return ((keys & positive) != 0) - ((keys & negative) != 0)
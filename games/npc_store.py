@@ -0,0 +1,114 @@
+import numpy as np
+
+from games.characters import NPC
+
+
+class NPCStore:
+    def __init__(self, capacity=64):
+        self.count = 0
+        self._x = np.zeros(capacity)
+        self._y = np.zeros(capacity)
+        self._speed_x = np.zeros(capacity)
+        self._speed_y = np.zeros(capacity)
+        self._size = np.zeros(capacity, dtype=np.int64)
+
+    @classmethod
+    def from_npcs(cls, npcs):
+        store = cls(max(len(npcs), 1))
+        for npc in npcs:
+            store.append(npc)
+        return store
+
+    # live views over the first `count` slots
+    @property
+    def x(self):
+        return self._x[:self.count]
+
+    @property
+    def y(self):
+        return self._y[:self.count]
+
+    @property
+    def speed_x(self):
+        return self._speed_x[:self.count]
+
+    @property
+    def speed_y(self):
+        return self._speed_y[:self.count]
+
+    @property
+    def size(self):
+        return self._size[:self.count]
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = len(self._x) * 2
+        for name in ("_x", "_y", "_speed_x", "_speed_y", "_size"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, x, y, speed_x=2, speed_y=2, size=20):
+        if self.count == len(self._x):
+            self._grow()
+        i = self.count
+        self._x[i] = x
+        self._y[i] = y
+        self._speed_x[i] = speed_x
+        self._speed_y[i] = speed_y
+        self._size[i] = size
+        self.count += 1
+        return i
+
+    def copy(self):
+        store = NPCStore.__new__(NPCStore)
+        store.count = self.count
+        for name in ("_x", "_y", "_speed_x", "_speed_y", "_size"):
+            setattr(store, name, getattr(self, name)[:self.count].copy())
+        return store
+
+    def append(self, npc):
+        return self.add(npc.x, npc.y, npc.speed_x, npc.speed_y, npc.size)
+
+    def remove(self, i):
+        # swap-remove: the last NPC takes slot i
+        last = self.count - 1
+        for arr in (self._x, self._y, self._speed_x, self._speed_y, self._size):
+            arr[i] = arr[last]
+        self.count = last
+
+    def move(self, game_field):
+        x, y = self.x, self.y
+        speed_x, speed_y = self.speed_x, self.speed_y
+
+        x += speed_x
+        y += speed_y
+
+        hit_x = (x < game_field.x_min) | (x > game_field.x_max)
+        hit_y = (y < game_field.y_min) | (y > game_field.y_max)
+
+        np.clip(x, game_field.x_min, game_field.x_max, out=x)
+        np.clip(y, game_field.y_min, game_field.y_max, out=y)
+
+        np.negative(speed_x, out=speed_x, where=hit_x)
+        np.negative(speed_y, out=speed_y, where=hit_y)
+
+    def positions(self):
+        return list(zip(self.x.tolist(), self.y.tolist()))
+
+    def get_bounding_boxes(self):
+        s = self.size // 2
+        return np.stack((self.x - s, self.y - s, self.x + s, self.y + s), axis=1)
+
+    def to_npcs(self):
+        return [
+            NPC(x, y, sx, sy, size)
+            for x, y, sx, sy, size in zip(
+                self.x.tolist(), self.y.tolist(),
+                self.speed_x.tolist(), self.speed_y.tolist(),
+                self.size.tolist(),
+            )
+        ]
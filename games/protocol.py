@@ -0,0 +1,150 @@
+import struct
+
+from games.keys import WIRE
+
+# Every message is a frame: <u32 payload length><payload>. The first payload
+# byte is the message type.
+FRAME_HEADER = struct.Struct("<I")
+MAX_FRAME = 16 * 1024 * 1024
+
+MSG_ACTIONS = 1
+# 2 was MSG_STATE, the full-state codec replaced by MSG_SNAPSHOT; do not reuse
+MSG_SNAPSHOT = 3
+MSG_JOIN = 4        # client -> server: move me to another room
+MSG_ROOM = 5        # server -> client: you are now in this room
+MSG_ACK = 6         # client -> server: snapshot ack, input unchanged
+MSG_HELLO = 7       # UDP only, client -> server: let me in
+MSG_WELCOME = 8     # UDP only, server -> client: your connection token and pid
+MSG_BYE = 9         # UDP only, client -> server: I am leaving
+
+NO_ACK = 0xFFFFFFFF
+ANY_ROOM = 0xFFFFFFFF
+
+# input is only sent when it changes: seq counts changes from 1, the client
+# tick is the first tick the keys apply to
+ACTIONS = struct.Struct("<BIIBI")         # type, input seq, client tick, key bits, acked snapshot tick
+ACK = struct.Struct("<BI")                # type, acked snapshot tick
+ROOM = struct.Struct("<BI")               # type, room id
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def message_type(payload):
+    return payload[0]
+
+
+def encode_actions(seq, tick, keys, ack=NO_ACK):
+    # keys: a games.keys bitmask
+    return frame(ACTIONS.pack(MSG_ACTIONS, seq, tick, keys & WIRE, ack))
+
+
+def decode_actions(payload):
+    # -> seq, client tick, keys, ack
+    return ACTIONS.unpack_from(payload)[1:]
+
+
+def encode_ack(ack):
+    return frame(ACK.pack(MSG_ACK, ack))
+
+
+def decode_ack(payload):
+    return ACK.unpack_from(payload)[1]
+
+
+def encode_join(room=ANY_ROOM):
+    return frame(ROOM.pack(MSG_JOIN, room))
+
+
+def encode_room(room):
+    return frame(ROOM.pack(MSG_ROOM, room))
+
+
+def decode_room(payload):
+    return ROOM.unpack_from(payload)[1]
+
+
+def send_parts(sock, parts):
+    # scatter/gather send, so a shared buffer goes out without being copied
+    # into a per-client frame first
+    if not hasattr(sock, "sendmsg"):
+        for part in parts:
+            sock.sendall(part)
+        return
+
+    views = [memoryview(p) for p in parts]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+
+class FrameDecoder:
+    def __init__(self, size=64 * 1024):
+        self.buf = bytearray(size)
+        self.start = 0
+        self.end = 0
+
+    def _make_room(self, needed):
+        pending = self.end - self.start
+        if needed > len(self.buf):
+            buf = bytearray(max(needed, len(self.buf) * 2))
+        else:
+            buf = self.buf
+        buf[:pending] = self.buf[self.start:self.end]
+        self.buf = buf
+        self.start = 0
+        self.end = pending
+
+    def recv_from(self, sock):
+        if self.end == len(self.buf):
+            self._make_room(self.end - self.start + 1)
+        with memoryview(self.buf) as view:
+            n = sock.recv_into(view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data):
+        if self.end + len(data) > len(self.buf):
+            self._make_room(self.end - self.start + len(data))
+        self.buf[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def pending(self):
+        # received but not yet returned as frames, e.g. to hand the
+        # connection over to another process
+        return bytes(self.buf[self.start:self.end])
+
+    def next_frame(self):
+        available = self.end - self.start
+        if available < FRAME_HEADER.size:
+            return None
+
+        (length,) = FRAME_HEADER.unpack_from(self.buf, self.start)
+        if length > MAX_FRAME:
+            raise ValueError(f"frame of {length} bytes is too large")
+
+        total = FRAME_HEADER.size + length
+        if available < total:
+            if self.start + total > len(self.buf):
+                self._make_room(total)
+            return None
+
+        payload = bytes(self.buf[self.start + FRAME_HEADER.size:self.start + total])
+        self.start += total
+        if self.start == self.end:
+            self.start = self.end = 0
+        return payload
+
+    def read_frame(self, sock):
+        # blocks until a whole frame is buffered; None means the peer closed
+        while True:
+            payload = self.next_frame()
+            if payload is not None:
+                return payload
+            if self.recv_from(sock) == 0:
+                return None
@@ -0,0 +1,390 @@
+import struct
+import sys
+import time
+from array import array
+from threading import Lock
+
+from games.game_field import GameField
+from games.protocol import MSG_SNAPSHOT, NO_ACK
+from games.spatial_hash import SpatialHash
+
+KEYFRAME = 1
+DENSE_NPCS = 2
+SPARSE_NPCS = 4     # interest-filtered: NPCs are keyed by id, not list position
+
+# A snapshot frame is a tiny per-client header followed by a body that is
+# encoded once per (tick, base tick) and shared by every client.
+# frame length, type, self pid, last input seq applied, client tick it reached
+CLIENT_HEADER = struct.Struct("<IBiII")
+SELF = struct.Struct("<BiII")           # the same header minus the frame length
+NO_INPUT = (0, 0)
+# flags, tick, base tick, n changed players, n removed players, n npcs, n changed npcs
+BODY_HEADER = struct.Struct("<BIIIIII")
+FIELD = struct.Struct("<dddd")          # keyframes only: x_min, y_min, x_max, y_max
+PLAYER = struct.Struct("<iHHi")         # id, qx, qy, score
+COUNT = struct.Struct("<I")             # sparse only: n NPCs that left the view
+
+
+def _pack(typecode, values):
+    a = array(typecode, values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(typecode, payload, offset, count):
+    a = array(typecode)
+    end = offset + count * a.itemsize
+    a.frombytes(payload[offset:end])
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a, end
+
+
+class Quantizer:
+    def __init__(self, game_field, bits=16):
+        self.game_field = game_field
+        self.q_max = (1 << bits) - 1
+        self.scale_x = self.q_max / ((game_field.x_max - game_field.x_min) or 1)
+        self.scale_y = self.q_max / ((game_field.y_max - game_field.y_min) or 1)
+
+    def quantize(self, x, y):
+        f = self.game_field
+        qx = round((min(max(x, f.x_min), f.x_max) - f.x_min) * self.scale_x)
+        qy = round((min(max(y, f.y_min), f.y_max) - f.y_min) * self.scale_y)
+        return qx, qy
+
+    def dequantize(self, qx, qy):
+        f = self.game_field
+        return f.x_min + qx / self.scale_x, f.y_min + qy / self.scale_y
+
+    def quantize_state(self, state):
+        q = self.quantize
+        players = {}
+        for pid, (x, y, score) in state["players"].items():
+            players[pid] = q(x, y) + (score,)
+        return players, [q(x, y) for x, y in state["npcs"]]
+
+
+def encode_snapshot_body(tick, snapshot, base_tick=None, base=None, game_field=None):
+    players, npcs = snapshot
+    flags = 0
+    out = []
+
+    if base is None:
+        flags |= KEYFRAME
+        base_tick = 0
+        base_players, base_npcs = {}, []
+    else:
+        base_players, base_npcs = base
+
+    changed = [
+        PLAYER.pack(player_id, *record)
+        for player_id, record in players.items()
+        if base_players.get(player_id) != record
+    ]
+    removed = [player_id for player_id in base_players if player_id not in players]
+
+    if isinstance(npcs, dict):
+        # an area-of-interest view: {npc id: (qx, qy)}, and anything missing
+        # from it that the base had has left the view
+        flags |= SPARSE_NPCS
+        base_npcs = base_npcs or {}
+        changed_npcs = [i for i, xy in npcs.items() if base_npcs.get(i) != xy]
+        removed_npcs = [i for i in base_npcs if i not in npcs]
+        npc_bytes = (COUNT.pack(len(removed_npcs)) + _pack("I", removed_npcs) +
+                     _pack("I", changed_npcs) +
+                     _pack("H", [c for i in changed_npcs for c in npcs[i]]))
+        n_changed_npcs = len(changed_npcs)
+    else:
+        n = len(base_npcs)
+        changed_npcs = [i for i in range(min(n, len(npcs))) if npcs[i] != base_npcs[i]]
+        changed_npcs.extend(range(n, len(npcs)))
+
+        # a moving crowd is cheaper to send whole (4 bytes/NPC) than as
+        # index + position records (8 bytes/NPC)
+        if base is None or len(changed_npcs) * 2 > len(npcs):
+            flags |= DENSE_NPCS
+            npc_bytes = _pack("H", [c for xy in npcs for c in xy])
+            n_changed_npcs = len(npcs)
+        else:
+            npc_bytes = (_pack("I", changed_npcs) +
+                         _pack("H", [c for i in changed_npcs for c in npcs[i]]))
+            n_changed_npcs = len(changed_npcs)
+
+    out.append(BODY_HEADER.pack(
+        flags, tick, base_tick,
+        len(changed), len(removed), len(npcs), n_changed_npcs,
+    ))
+    if flags & KEYFRAME:
+        f = game_field
+        out.append(FIELD.pack(f.x_min, f.y_min, f.x_max, f.y_max))
+    out.extend(changed)
+    out.append(_pack("i", removed))
+    out.append(npc_bytes)
+    return b"".join(out)
+
+
+def client_header(pid, body, input_ack=NO_INPUT):
+    return CLIENT_HEADER.pack(SELF.size + len(body), MSG_SNAPSHOT, pid, *input_ack)
+
+
+class TickSnapshot:
+    # One tick of world state, quantized once. Encoded bodies are cached by
+    # the base tick they are a delta against (None for the keyframe).
+    def __init__(self, tick, snapshot, game_field, profiler=None, input_acks=None):
+        self.tick = tick
+        self.snapshot = snapshot
+        self.input_acks = input_acks or {}
+        self.game_field = game_field
+        self.profiler = profiler
+        self.bodies = {}
+        self.grids = None
+
+    def interest_grids(self, cell_size):
+        # built on first use and shared by every client's view query; a
+        # concurrent first use just builds it twice
+        grids = self.grids
+        if grids is None:
+            players, npcs = self.snapshot
+            space = GameField(0, 0, 1 << 16, 1 << 16)
+            player_grid = SpatialHash(space, cell_size)
+            for player_id, (qx, qy, _) in players.items():
+                player_grid.insert(player_id, qx, qy)
+            npc_grid = SpatialHash(space, cell_size)
+            for i, (qx, qy) in enumerate(npcs):
+                npc_grid.insert(i, qx, qy)
+            grids = self.grids = (player_grid, npc_grid)
+        return grids
+
+    def body(self, base=None):
+        key = None if base is None else base.tick
+        data = self.bodies.get(key)
+        if data is None:
+            start = time.perf_counter()
+            if base is None:
+                data = encode_snapshot_body(self.tick, self.snapshot,
+                                            game_field=self.game_field)
+            else:
+                data = encode_snapshot_body(self.tick, self.snapshot,
+                                            base.tick, base.snapshot)
+            self.bodies[key] = data
+            if self.profiler is not None:
+                self.profiler.record("encode", time.perf_counter() - start)
+        return data
+
+
+class SnapshotCache:
+    # server side, shared by all connections: the world is quantized once
+    # per tick and recent ticks are kept around as delta baselines
+    def __init__(self, game_field, history=128, profiler=None, view_radius=None):
+        self.game_field = game_field
+        self.quantizer = Quantizer(game_field)
+        self.history = history
+        # world units; None sends everyone the whole world
+        self.view_radius = view_radius
+        # anything with record(phase, seconds), e.g. server.profiler.TickProfiler
+        self.profiler = profiler
+        self.ticks = {}
+        self.lock = Lock()
+
+    def get(self, engine):
+        front = engine.front
+        snap = self.ticks.get(front.tick)
+        if snap is not None:
+            return snap
+
+        with self.lock:
+            snap = self.ticks.get(front.tick)
+            if snap is None:
+                start = time.perf_counter()
+                snap = TickSnapshot(front.tick, self.quantizer.quantize_state(front.state()),
+                                    self.game_field, self.profiler, front.input_acks)
+                if self.profiler is not None:
+                    self.profiler.record("quantize", time.perf_counter() - start)
+                self.ticks[snap.tick] = snap
+                for old in [t for t in self.ticks if t <= snap.tick - self.history]:
+                    del self.ticks[old]
+        return snap
+
+    def encoder(self):
+        if self.view_radius is None:
+            return SnapshotEncoder(self)
+        return InterestEncoder(self, self.view_radius)
+
+
+class SnapshotEncoder:
+    # server side, one per client: only tracks what the client acked
+    def __init__(self, cache):
+        self.cache = cache
+        self.acked = None
+
+    def resync(self):
+        self.acked = None
+
+    def ack(self, tick):
+        if tick == NO_ACK or tick not in self.cache.ticks:
+            self.resync()
+        elif self.acked is None or tick > self.acked:
+            self.acked = tick
+
+    def encode(self, snap, pid):
+        base = None
+        if self.acked is not None:
+            # a baseline that aged out of the cache means a keyframe
+            base = self.cache.ticks.get(self.acked)
+        body = snap.body(base)
+        return [client_header(pid, body, snap.input_acks.get(pid, NO_INPUT)), body]
+
+
+class InterestEncoder:
+    # server side, one per client, for area-of-interest filtering: each client
+    # gets the players and NPCs within view_radius of its own player. Views
+    # differ per client, so bodies are encoded per client against the view
+    # it last acked, which this keeps a short history of.
+    def __init__(self, cache, view_radius):
+        self.cache = cache
+        q = cache.quantizer
+        self.scale_x = q.scale_x
+        self.scale_y = q.scale_y
+        self.radius = view_radius
+        # in quantized units; wide enough on both axes for non-square fields
+        self.q_radius = view_radius * max(q.scale_x, q.scale_y)
+        self.sent = {}
+        self.acked = None
+
+    def resync(self):
+        self.acked = None
+
+    def ack(self, tick):
+        if tick == NO_ACK or tick not in self.sent:
+            self.resync()
+        elif self.acked is None or tick > self.acked:
+            self.acked = tick
+            for old in [t for t in self.sent if t < tick]:
+                del self.sent[old]
+
+    def view(self, snap, pid):
+        players, npcs = snap.snapshot
+        me = players.get(pid)
+        if me is None:
+            # not in the world yet (or any more): nothing is in view
+            return {}, {}
+
+        cx, cy = me[0], me[1]
+        sx, sy = self.scale_x, self.scale_y
+        r2 = self.radius * self.radius
+        player_grid, npc_grid = snap.interest_grids(self.q_radius)
+
+        seen_players = {}
+        for player_id in player_grid.query(cx, cy, self.q_radius):
+            record = players[player_id]
+            dx, dy = (record[0] - cx) / sx, (record[1] - cy) / sy
+            if dx * dx + dy * dy <= r2:
+                seen_players[player_id] = record
+
+        seen_npcs = {}
+        for i in npc_grid.query(cx, cy, self.q_radius):
+            qx, qy = npcs[i]
+            dx, dy = (qx - cx) / sx, (qy - cy) / sy
+            if dx * dx + dy * dy <= r2:
+                seen_npcs[i] = npcs[i]
+        return seen_players, seen_npcs
+
+    def encode(self, snap, pid):
+        view = self.view(snap, pid)
+        base = None if self.acked is None else self.sent.get(self.acked)
+        if base is None:
+            body = encode_snapshot_body(snap.tick, view, game_field=self.cache.game_field)
+        else:
+            body = encode_snapshot_body(snap.tick, view, self.acked, base)
+
+        self.sent[snap.tick] = view
+        for old in [t for t in self.sent if t <= snap.tick - self.cache.history]:
+            del self.sent[old]
+        return [client_header(pid, body, snap.input_acks.get(pid, NO_INPUT)), body]
+
+
+class SnapshotDecoder:
+    # client side: rebuilds full states from keyframes and deltas
+    def __init__(self, history=64):
+        self.history = history
+        self.snapshots = {}
+        self.quantizer = None
+        self.visible = (set(), set())
+
+    def decode(self, payload):
+        payload = memoryview(payload)
+        _, pid, input_seq, input_tick = SELF.unpack_from(payload)
+        (flags, tick, base_tick, n_changed, n_removed,
+         n_npcs, n_changed_npcs) = BODY_HEADER.unpack_from(payload, SELF.size)
+        offset = SELF.size + BODY_HEADER.size
+
+        if flags & KEYFRAME:
+            self.quantizer = Quantizer(GameField(*FIELD.unpack_from(payload, offset)))
+            offset += FIELD.size
+            players, npcs = {}, {} if flags & SPARSE_NPCS else []
+        else:
+            base = self.snapshots.get(base_tick)
+            if base is None or self.quantizer is None:
+                # lost our baseline; the caller should ask for a keyframe
+                return None
+            players, npcs = dict(base[0]), (dict if flags & SPARSE_NPCS else list)(base[1])
+
+        end = offset + n_changed * PLAYER.size
+        for player_id, qx, qy, score in PLAYER.iter_unpack(payload[offset:end]):
+            players[player_id] = (qx, qy, score)
+        removed, offset = _unpack("i", payload, end, n_removed)
+        for player_id in removed:
+            players.pop(player_id, None)
+
+        if flags & SPARSE_NPCS:
+            (n_removed_npcs,) = COUNT.unpack_from(payload, offset)
+            removed, offset = _unpack("I", payload, offset + COUNT.size, n_removed_npcs)
+            for i in removed:
+                npcs.pop(i, None)
+            ids, offset = _unpack("I", payload, offset, n_changed_npcs)
+            coords, offset = _unpack("H", payload, offset, 2 * n_changed_npcs)
+            for j, i in enumerate(ids):
+                npcs[i] = (coords[2 * j], coords[2 * j + 1])
+        elif flags & DENSE_NPCS:
+            coords, offset = _unpack("H", payload, offset, 2 * n_npcs)
+            npcs = list(zip(coords[0::2], coords[1::2]))
+        else:
+            indices, offset = _unpack("I", payload, offset, n_changed_npcs)
+            coords, offset = _unpack("H", payload, offset, 2 * n_changed_npcs)
+            del npcs[n_npcs:]
+            npcs.extend([(0, 0)] * (n_npcs - len(npcs)))
+            for j, i in enumerate(indices):
+                npcs[i] = (coords[2 * j], coords[2 * j + 1])
+
+        self.snapshots[tick] = (players, npcs)
+        for old in [t for t in self.snapshots if t < tick - self.history]:
+            del self.snapshots[old]
+
+        dq = self.quantizer.dequantize
+        state = {
+            "players": {
+                player_id: dq(qx, qy) + (score,)
+                for player_id, (qx, qy, score) in players.items()
+            },
+            "self": pid,
+            "tick": tick,
+            "input_seq": input_seq,
+            "input_tick": input_tick,
+        }
+        if flags & SPARSE_NPCS:
+            state["npc_ids"] = list(npcs)
+            state["npcs"] = [dq(qx, qy) for qx, qy in npcs.values()]
+
+            # enter/leave relative to the previous state we handed out
+            player_ids, npc_ids = set(players), set(npcs)
+            last_players, last_npcs = self.visible
+            state["entered"] = {"players": player_ids - last_players,
+                                "npcs": npc_ids - last_npcs}
+            state["left"] = {"players": last_players - player_ids,
+                             "npcs": last_npcs - npc_ids}
+            self.visible = (player_ids, npc_ids)
+        else:
+            state["npcs"] = [dq(qx, qy) for qx, qy in npcs]
+        return state
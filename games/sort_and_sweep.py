@@ -0,0 +1,46 @@
+class SortAndSweep:
+    # Broadphase over axis-aligned boxes: objects are kept sorted by the left
+    # edge of their box, and a sweep along x pairs up everything whose x
+    # intervals overlap. The order is kept between calls and only repaired,
+    # which is close to linear when things move a little per frame.
+    def __init__(self):
+        self.order = []
+        self.members = set()
+
+    def _sync(self, objects):
+        # keep the survivors in their current order, new objects go last and
+        # get sorted into place like everything else
+        ids = {id(o) for o in objects}
+        if ids != self.members:
+            self.order = [o for o in self.order if id(o) in ids]
+            kept = {id(o) for o in self.order}
+            self.order.extend(o for o in objects if id(o) not in kept)
+            self.members = ids
+
+    def pairs(self, objects):
+        self._sync(objects)
+        order = self.order
+        boxes = [o.get_bounding_box() for o in order]
+
+        # re-sort by left edge. Starting from last frame's order the input is
+        # nearly sorted, which Timsort (an insertion sort over short runs,
+        # then merges) handles in close to linear time
+        keys = [box[0] for box in boxes]
+        idx = sorted(range(len(order)), key=keys.__getitem__)
+        order[:] = [order[i] for i in idx]
+        boxes = [boxes[i] for i in idx]
+
+        # sweep: everything after i that starts before i ends overlaps it on x
+        found = []
+        n = len(boxes)
+        for i in range(n):
+            x0, y0, x1, y1 = boxes[i]
+            j = i + 1
+            while j < n:
+                other = boxes[j]
+                if other[0] > x1:
+                    break
+                if other[1] <= y1 and y0 <= other[3]:
+                    found.append((order[i], order[j]))
+                j += 1
+        return found
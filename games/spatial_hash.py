@@ -0,0 +1,40 @@
+class SpatialHash:
+    def __init__(self, game_field, cell_size):
+        self.game_field = game_field
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell(self, x, y):
+        return (
+            int((x - self.game_field.x_min) // self.cell_size),
+            int((y - self.game_field.y_min) // self.cell_size),
+        )
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, key, x, y):
+        cell = self.cell(x, y)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            self.cells[cell] = [key]
+        else:
+            bucket.append(key)
+
+    def rebuild(self, objects):
+        # keys are list indices, so callers can map hits back with objects[i]
+        self.cells.clear()
+        for i, obj in enumerate(objects):
+            self.insert(i, obj.x, obj.y)
+
+    def query(self, x, y, r):
+        cx0, cy0 = self.cell(x - r, y - r)
+        cx1, cy1 = self.cell(x + r, y + r)
+        cells = self.cells
+        found = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        return found
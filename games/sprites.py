@@ -0,0 +1,34 @@
+import pygame
+import pygame.gfxdraw
+
+
+class SpriteCache:
+    # Pre-rendered anti-aliased shapes keyed by (shape, radius, color), so
+    # drawing an entity is a blit instead of a rasterization.
+    def __init__(self):
+        self.sprites = {}
+
+    def circle(self, radius, color):
+        key = ("circle", radius, color)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = self._render_circle(radius, pygame.Color(color))
+        return sprite
+
+    def _render_circle(self, radius, color):
+        size = radius * 2 + 1
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.gfxdraw.filled_circle(surface, radius, radius, radius, color)
+        pygame.gfxdraw.aacircle(surface, radius, radius, radius, color)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        # RLE encoding skips the transparent corners, which makes software
+        # alpha blits roughly twice as fast
+        surface.set_alpha(255, pygame.RLEACCEL)
+        return surface
+
+    def blit_circles(self, target, points, radius, color, doreturn=False):
+        # one Surface.blits call for every circle of this kind
+        sprite = self.circle(radius, color)
+        return target.blits([(sprite, (x - radius, y - radius)) for x, y in points],
+                            doreturn)
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import random
+import struct
+import time
+from collections import deque
+
+from games.protocol import MSG_BYE, MSG_HELLO, MSG_WELCOME
+from games.snapshot import SELF
+
+clock = time.perf_counter
+
+# UDP transport. A datagram carries the same payloads as a TCP frame, minus
+# the length prefix, wrapped in a small header:
+#
+#   <u32 connection token><u32 ack><u8 n>  n x (<u32 seq><u16 len><payload>)  [payload]
+#
+# The n sequenced payloads are the reliable channel (input changes, leaving):
+# each side acks the highest seq it has delivered in order, and everything
+# unacked rides along on every datagram until it is acked. The trailing
+# payload is unreliable: snapshots, which are sequenced by tick so stale ones
+# are dropped, and snapshot acks. The token, handed out in MSG_WELCOME, is
+# what identifies a connection, not the address it comes from.
+HEADER = struct.Struct("<IIB")
+RELIABLE = struct.Struct("<IH")
+HELLO = struct.Struct("<BI")            # type, client nonce
+WELCOME = struct.Struct("<BIIi")        # type, client nonce, token, pid
+BYE = struct.Struct("<B")
+
+# stays under IPv4's datagram limit; bigger snapshots need --view-radius
+MAX_DATAGRAM = 65507
+MAX_RELIABLE = 32
+
+# a snapshot's tick sits right after its body flags
+TICK = struct.Struct("<I")
+TICK_OFFSET = SELF.size + 1
+
+
+def snapshot_tick(payload):
+    return TICK.unpack_from(payload, TICK_OFFSET)[0]
+
+
+def encode_hello(nonce):
+    return HELLO.pack(MSG_HELLO, nonce)
+
+
+def decode_hello(payload):
+    return HELLO.unpack_from(payload)[1]
+
+
+def encode_welcome(nonce, token, pid):
+    return WELCOME.pack(MSG_WELCOME, nonce, token, pid)
+
+
+def decode_welcome(payload):
+    # -> nonce, token, pid
+    return WELCOME.unpack_from(payload)[1:]
+
+
+def encode_bye():
+    return BYE.pack(MSG_BYE)
+
+
+class ReliableChannel:
+    # Both directions of one connection's reliable messages: what we queue()
+    # is resent until the peer acks it, and receive() hands over the peer's
+    # messages in order, once each.
+    def __init__(self, resend=0.05):
+        self.resend = resend
+        self.next_seq = 1
+        self.unacked = deque()      # (seq, payload)
+        self.last_sent = 0.0
+        self.delivered = 0          # highest peer seq handed over in order
+        self.early = {}             # peer seq -> payload, waiting for a gap
+
+    def queue(self, payload):
+        self.unacked.append((self.next_seq, payload))
+        self.next_seq += 1
+
+    def on_ack(self, ack):
+        while self.unacked and self.unacked[0][0] <= ack:
+            self.unacked.popleft()
+
+    def receive(self, seq, payload):
+        if seq <= self.delivered or seq in self.early:
+            return []
+        self.early[seq] = payload
+        out = []
+        while self.delivered + 1 in self.early:
+            self.delivered += 1
+            out.append(self.early.pop(self.delivered))
+        return out
+
+    def due(self, now):
+        # something unacked and nothing sent for a while: send on its own
+        return bool(self.unacked) and now - self.last_sent >= self.resend
+
+
+def encode_packet(token, channel=None, payload=b""):
+    if channel is None:
+        return HEADER.pack(token, 0, 0) + payload
+    messages = list(itertools.islice(channel.unacked, MAX_RELIABLE))
+    parts = [HEADER.pack(token, channel.delivered, len(messages))]
+    for seq, message in messages:
+        parts.append(RELIABLE.pack(seq, len(message)))
+        parts.append(message)
+    parts.append(payload)
+    if messages:
+        channel.last_sent = clock()
+    return b"".join(parts)
+
+
+def decode_packet(data):
+    # -> token, ack, [(seq, payload)], payload; raises struct.error if short
+    token, ack, n = HEADER.unpack_from(data)
+    offset = HEADER.size
+    messages = []
+    for _ in range(n):
+        seq, length = RELIABLE.unpack_from(data, offset)
+        offset += RELIABLE.size
+        if offset + length > len(data):
+            raise struct.error("reliable message runs past the datagram")
+        messages.append((seq, data[offset:offset + length]))
+        offset += length
+    return token, ack, messages, data[offset:]
+
+
+class LinkSimulator:
+    # Sits in front of one end's sendto and drops, delays and jitters what
+    # goes out, to try the transport on a bad network from localhost. Jitter
+    # reorders datagrams, as real networks do. Delayed datagrams go through
+    # call_later (e.g. an asyncio loop's) if given, otherwise they wait in a
+    # heap for flush(), which the owner calls from its own loop.
+    def __init__(self, sendto, loss=0.0, latency=0.0, jitter=0.0, seed=None, call_later=None):
+        self.sendto = sendto
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.call_later = call_later
+        self.queue = []
+        self.counter = itertools.count()
+        self.dropped = 0
+
+    def send(self, data, addr):
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.rng.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay <= 0:
+            self.sendto(data, addr)
+        elif self.call_later is not None:
+            self.call_later(delay, self.sendto, data, addr)
+        else:
+            heapq.heappush(self.queue, (clock() + delay, next(self.counter), data, addr))
+
+    def flush(self):
+        now = clock()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, addr = heapq.heappop(self.queue)
+            self.sendto(data, addr)
+
+    def next_due(self):
+        # seconds until flush() has something to send, None if nothing waits
+        if not self.queue:
+            return None
+        return max(0.0, self.queue[0][0] - clock())
@@ -2,8 +2,96 @@
 # Date: 2024-06-10
 # Description: Graphic engine class
 import os
-from typing import Iterable, List, Optional
+import sys
+from typing import BinaryIO, Iterable, List, Optional
+# Keeps a byte framebuffer, diffs it against the previous frame and writes
+# only the changed spans with cursor-positioning escapes, in one write per
+# frame. No subprocess and no full redraw.
 class GraphicsEngine:
+    def __init__(self, empty_char: str = ".", stream: Optional[BinaryIO] = None):
+        self.empty_char = empty_char
+        self.stream = stream if stream is not None else sys.stdout.buffer
+        self.empty = self._cell(empty_char)
+        self.width = 0
+        self.height = 0
+        self.frame = bytearray()
+        self.prev = bytearray()
+        self.blank = b""
+        self.prev_hud: List[str] = []
+        self.out = bytearray()
+
+    @staticmethod
+    def _cell(char) -> int:
+        c = ord(str(char)[0])
+        return c if 32 <= c < 127 else ord("?")
+
+    def _resize(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.blank = bytes([self.empty]) * (width * height)
+        self.frame = bytearray(self.blank)
+        # force every row to differ from the first real frame
+        self.prev = bytearray(b"\0" * (width * height))
+        self.prev_hud = []
+        # clear screen, home, hide cursor
+        self.out += b"\x1b[2J\x1b[H\x1b[?25l"
+
+    def clear(self) -> None:
+        self.width = self.height = 0
+
+    def close(self) -> None:
+        self.stream.write(f"\x1b[{self.height + len(self.prev_hud) + 2};1H\x1b[?25h".encode())
+        self.stream.flush()
+
+    def render(self,
+               width: int,
+               height: int,
+               entities: Iterable,
+               hud_lines: Optional[List[str]] = None) -> None:
+        if (width, height) != (self.width, self.height):
+            self._resize(width, height)
+
+        frame = self.frame
+        frame[:] = self.blank
+        for e in entities:
+            x, y = int(e.x), int(e.y)
+            if 0 <= x < width and 0 <= y < height:
+                frame[y * width + x] = self._cell(e.char)
+
+        out = self.out
+        prev = self.prev
+        for row in range(height):
+            start = row * width
+            end = start + width
+            if frame[start:end] == prev[start:end]:
+                continue
+            # XOR the rows as big integers: the highest set bit is the first
+            # changed column, the lowest set bit the last one
+            diff = (int.from_bytes(frame[start:end], "big") ^
+                    int.from_bytes(prev[start:end], "big"))
+            first = width - 1 - (diff.bit_length() - 1) // 8
+            last = width - 1 - ((diff & -diff).bit_length() - 1) // 8
+            out += b"\x1b[%d;%dH" % (row + 1, first + 1)
+            out += frame[start + first:start + last + 1]
+
+        hud_lines = hud_lines or []
+        if hud_lines != self.prev_hud:
+            out += b"\x1b[%d;1H\x1b[J" % (height + 2)
+            out += "\r\n".join(hud_lines).encode()
+            self.prev_hud = list(hud_lines)
+
+        if out:
+            self.stream.write(out)
+            self.stream.flush()
+            out.clear()
+
+        self.frame, self.prev = prev, frame
+
+
+# The original renderer: clears the screen with a clear/cls subprocess and
+# prints the whole grid every frame. Only for consoles that do not understand
+# ANSI escapes; GraphicsEngine is the one to use.
+class ClearScreenGraphicsEngine:
     def __init__(self, clear_each_frame: bool = True, empty_char: str = "."):
         self.clear_each_frame = clear_each_frame
         self.empty_char = empty_char
@@ -33,4 +121,4 @@ class GraphicsEngine:
         if hud_lines:
             print()
             for line in hud_lines:
-                print(line)
\ No newline at end of file
+                print(line)
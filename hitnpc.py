@@ -2,23 +2,30 @@ import pygame
 import math
 import random
 
+from games.keys import (DOWN, FIRE, LEFT, QUIT, RIGHT, ROTATE_LEFT, ROTATE_RIGHT, UP,
+                        axis)
+from games.spatial_hash import SpatialHash
+from games.sprites import SpriteCache
+
 #INPUT
 class KBPoller:
+    # fills self.pressed with a games.keys bitmask
+    KEYMAP = (
+        (pygame.K_a, LEFT), (pygame.K_d, RIGHT), (pygame.K_w, UP), (pygame.K_s, DOWN),
+        (pygame.K_q, QUIT), (pygame.K_LEFT, ROTATE_LEFT), (pygame.K_RIGHT, ROTATE_RIGHT),
+        (pygame.K_SPACE, FIRE),
+    )
+
     def __init__(self):
-        self.pressed = set()
+        self.pressed = 0
 
     def poll(self):
         keys = pygame.key.get_pressed()
-        self.pressed.clear()
-
-        if keys[pygame.K_a]: self.pressed.add("a")
-        if keys[pygame.K_d]: self.pressed.add("d")
-        if keys[pygame.K_w]: self.pressed.add("w")
-        if keys[pygame.K_s]: self.pressed.add("s")
-        if keys[pygame.K_q]: self.pressed.add("q")
-        if keys[pygame.K_LEFT]: self.pressed.add("left")
-        if keys[pygame.K_RIGHT]: self.pressed.add("right")
-        if keys[pygame.K_SPACE]: self.pressed.add("fire")
+        pressed = 0
+        for key, bit in self.KEYMAP:
+            if keys[key]:
+                pressed |= bit
+        self.pressed = pressed
 
 
 class InputController:
@@ -49,6 +56,8 @@ class GameField:
 
 
 class Player:
+    __slots__ = ("x", "y", "speed", "angle", "rot_speed")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -56,19 +65,21 @@ class Player:
         self.angle = 0.0
         self.rot_speed = 3.0  # rad/sec
 
-    def move(self, left, right, up, down, game_field, dt):
-        self.x += self.speed * dt * (right - left)
-        self.y += self.speed * dt * (down - up)
+    def move(self, keys, game_field, dt):
+        self.x += self.speed * dt * axis(keys, LEFT, RIGHT)
+        self.y += self.speed * dt * axis(keys, UP, DOWN)
         self.x, self.y = game_field.clamp(self.x, self.y)
 
-    def rotate(self, left, right, dt):
-        self.angle += self.rot_speed * dt * (right - left)
+    def rotate(self, keys, dt):
+        self.angle += self.rot_speed * dt * axis(keys, ROTATE_LEFT, ROTATE_RIGHT)
 
     def fire(self):
         return Bullet(self.x, self.y, self.angle)
 
 
 class NPC:
+    __slots__ = ("x", "y", "speed_x", "speed_y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -85,6 +96,8 @@ class NPC:
 
 
 class Bullet:
+    __slots__ = ("x", "y", "speed", "vx", "vy")
+
     def __init__(self, x, y, angle):
         self.x = x
         self.y = y
@@ -108,6 +121,7 @@ class GraphicsEngine:
         self.screen = pygame.display.set_mode((1280, 720))
         pygame.display.set_caption("GameEngine + pygame")
         self.clock = pygame.time.Clock()
+        self.sprites = SpriteCache()
         self.dt = 0
 
     def start_frame(self):
@@ -125,11 +139,16 @@ class GraphicsEngine:
                          (player.x, player.y), (end_x, end_y), 4)
 
     def draw_npc(self, npc):
-        pygame.draw.circle(self.screen, "blue", (int(npc.x), int(npc.y)), 40)
+        self.screen.blit(self.sprites.circle(40, "blue"), (npc.x - 40, npc.y - 40))
+
+    def draw_npcs(self, npcs):
+        self.sprites.blit_circles(self.screen, [(n.x, n.y) for n in npcs], 40, "blue")
 
     def draw_bullet(self, bullet):
-        pygame.draw.circle(self.screen, "yellow",
-                           (int(bullet.x), int(bullet.y)), 6)
+        self.screen.blit(self.sprites.circle(6, "yellow"), (bullet.x - 6, bullet.y - 6))
+
+    def draw_bullets(self, bullets):
+        self.sprites.blit_circles(self.screen, [(b.x, b.y) for b in bullets], 6, "yellow")
 
     def show_frame(self):
         pygame.display.flip()
@@ -145,47 +164,56 @@ class GameEngine:
         self.player = player
         self.npcs = []
         self.bullets = []
+        self.npc_grid = SpatialHash(game_field, 40)
         self.running = True
 
     def update(self, keys):
-        self.player.move(
-            "a" in keys, "d" in keys,
-            "w" in keys, "s" in keys,
-            self.game_field, self.graphics.dt
-        )
-
-        self.player.rotate("left" in keys, "right" in keys, self.graphics.dt)
+        self.player.move(keys, self.game_field, self.graphics.dt)
+        self.player.rotate(keys, self.graphics.dt)
 
-        if "fire" in keys:
+        if keys & FIRE:
             self.bullets.append(self.player.fire())
 
         for npc in self.npcs:
             npc.move(self.game_field, self.graphics.dt)
 
-        for bullet in self.bullets[:]:
+        for bullet in self.bullets:
             bullet.move(self.graphics.dt)
-            if not self.game_field.inside(bullet.x, bullet.y):
-                self.bullets.remove(bullet)
+        self.bullets = [b for b in self.bullets
+                        if self.game_field.inside(b.x, b.y)]
 
-        for bullet in self.bullets[:]:
-            for npc in self.npcs[:]:
-                if hit(bullet, npc, 40):
-                    self.bullets.remove(bullet)
-                    self.npcs.remove(npc)
-                    break
+        self.hit_npcs(40)
 
-        if "q" in keys:
+        if keys & QUIT:
             self.running = False
 
+    def hit_npcs(self, radius):
+        # each bullet takes out the first live NPC (in list order) it touches
+        self.npc_grid.rebuild(self.npcs)
+        dead = set()
+        survivors = []
+        for bullet in self.bullets:
+            target = None
+            for i in self.npc_grid.query(bullet.x, bullet.y, radius):
+                if i in dead or (target is not None and i > target):
+                    continue
+                if hit(bullet, self.npcs[i], radius):
+                    target = i
+            if target is None:
+                survivors.append(bullet)
+            else:
+                dead.add(target)
+
+        self.bullets = survivors
+        if dead:
+            self.npcs = [n for i, n in enumerate(self.npcs) if i not in dead]
+
     def render(self):
         self.graphics.start_frame()
         self.graphics.draw_player(self.player)
 
-        for npc in self.npcs:
-            self.graphics.draw_npc(npc)
-
-        for bullet in self.bullets:
-            self.graphics.draw_bullet(bullet)
+        self.graphics.draw_npcs(self.npcs)
+        self.graphics.draw_bullets(self.bullets)
 
         self.graphics.show_frame()
 
@@ -0,0 +1,114 @@
+import asyncio
+import struct
+
+from games.characters import Player
+from games.protocol import (
+    MSG_ACK, MSG_ACTIONS, MSG_JOIN, FrameDecoder, decode_ack, decode_actions, decode_room,
+    message_type,
+)
+
+
+class AsyncClient:
+    def __init__(self, pid, reader, writer, engine, cache, reply=True,
+                 max_buffered=256 * 1024, frames=None, rooms=False):
+        self.pid = pid
+        self.reader = reader
+        self.writer = writer
+        self.engine = engine
+        self.cache = cache
+        self.reply = reply
+        self.snapshots = cache.encoder()
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        # frames may already hold input received by a previous owner
+        self.frames = frames or FrameDecoder()
+        # with rooms, run() returns the room id of a join request
+        self.rooms = rooms
+
+        # drain() blocks once this much is waiting in the transport buffer
+        writer.transport.set_write_buffer_limits(high=max_buffered // 4)
+
+    def send(self, parts):
+        # The transport buffer is this client's outgoing queue. Every reply is
+        # a delta against the client's last ack, so once a slow client has
+        # max_buffered bytes queued we can skip replies instead of growing it.
+        if self.writer.transport.get_write_buffer_size() > self.max_buffered:
+            self.dropped += 1
+            return
+        self.writer.writelines(parts)
+
+    def push(self, snap):
+        self.send(self.snapshots.encode(snap, self.pid))
+
+    async def run(self):
+        frames = self.frames
+        while True:
+            while True:
+                payload = frames.next_frame()
+                if payload is None:
+                    break
+                kind = message_type(payload)
+                if kind == MSG_JOIN and self.rooms:
+                    return decode_room(payload)
+                if kind == MSG_ACTIONS:
+                    seq, tick, keys, ack = decode_actions(payload)
+                    self.engine.queue_input(self.pid, seq, tick, keys)
+                elif kind == MSG_ACK:
+                    ack = decode_ack(payload)
+                else:
+                    continue
+                self.snapshots.ack(ack)
+                if self.reply:
+                    self.push(self.cache.get(self.engine))
+
+            # stop reading from a client that is not reading from us; this
+            # only pauses this connection, everyone else keeps being served
+            await self.writer.drain()
+
+            data = await self.reader.read(64 * 1024)
+            if not data:
+                return None
+            frames.feed(data)
+
+
+async def serve(engine, host, port, cache, broadcaster=None):
+    next_pid = 0
+    if broadcaster is not None:
+        engine.tick_listeners.append(broadcaster.on_tick)
+
+    async def on_connect(reader, writer):
+        nonlocal next_pid
+        next_pid += 1
+        pid = next_pid
+        addr = writer.get_extra_info("peername")
+        print(f"[SERVER] Player {pid} connected from {addr}", flush=True)
+
+        engine.add_player(Player(pid, 100, 100))
+        client = AsyncClient(pid, reader, writer, engine, cache,
+                             reply=broadcaster is None)
+        if broadcaster is not None:
+            broadcaster.add(client)
+        try:
+            await client.run()
+            print(f"[SERVER] Player {pid} disconnected", flush=True)
+        except (ConnectionError, ValueError, struct.error) as e:
+            print(f"[SERVER] Error with player {pid}: {e}", flush=True)
+        finally:
+            if broadcaster is not None:
+                broadcaster.remove(client)
+            engine.remove_player(pid)
+            writer.close()
+
+    server = await asyncio.start_server(on_connect, host, port, backlog=1024)
+    print(f"[SERVER] Listening on port {port} (asyncio)...", flush=True)
+
+    tick = asyncio.create_task(engine.run_game_async())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        tick.cancel()
+
+
+def main_async(engine, host, port, cache, broadcaster=None):
+    asyncio.run(serve(engine, host, port, cache, broadcaster))
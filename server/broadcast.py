@@ -0,0 +1,27 @@
+from threading import Lock
+
+
+class Broadcaster:
+    def __init__(self, cache, fps=60, send_rate=20):
+        self.cache = cache
+        self.interval = max(1, round(fps / send_rate))
+        # copy-on-write: writers take the lock, on_tick reads without it
+        self.clients = []
+        self.lock = Lock()
+
+    def add(self, client):
+        with self.lock:
+            self.clients = self.clients + [client]
+
+    def remove(self, client):
+        with self.lock:
+            self.clients = [c for c in self.clients if c is not client]
+
+    def on_tick(self, engine):
+        if engine.tick % self.interval:
+            return
+        snap = self.cache.get(engine)
+        # self.clients is replaced, never mutated, so this is safe to iterate
+        # while connections come and go on other threads
+        for client in self.clients:
+            client.push(snap)
@@ -1,50 +1,219 @@
+import argparse
+import random
 import socket
-from threading import Thread
+import time
+from threading import Condition, Thread
 
 from games.characters import Player, NPC
 from games.game_field import GameField
+from games.protocol import (
+    MSG_ACK, MSG_ACTIONS, FrameDecoder, decode_ack, decode_actions, message_type, send_parts,
+)
+from games.snapshot import SnapshotCache
+from server.async_net_game_serv import main_async
+from server.broadcast import Broadcaster
+from server.profiler import NULL_PROFILER, TickProfiler
 from server.server_game_engine import ServerGameEngine
-
-
-def client_thread(conn, pid, engine):
+from server.tick_scheduler import FixedTimestep
+from server.udp_net_game_serv import main_udp
+
+
+def timed_send(conn, parts, profiler):
+    if not profiler.enabled:
+        send_parts(conn, parts)
+        return
+    start = time.perf_counter()
+    send_parts(conn, parts)
+    profiler.record("send", time.perf_counter() - start)
+
+
+class PushSender:
+    # Owns the downlink of one client in broadcast mode. The tick thread only
+    # drops the newest snapshot in a one-slot mailbox, so a slow socket never
+    # stalls the simulation; unsent snapshots are simply superseded.
+    def __init__(self, conn, pid, cache, profiler=NULL_PROFILER):
+        self.conn = conn
+        self.pid = pid
+        self.profiler = profiler
+        self.snapshots = cache.encoder()
+        self.cond = Condition()
+        self.snap = None
+        self.acked = None
+        self.closed = False
+
+    def push(self, snap):
+        with self.cond:
+            self.snap = snap
+            self.cond.notify()
+
+    def ack(self, tick):
+        with self.cond:
+            self.acked = tick
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.snap is None and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                snap, self.snap = self.snap, None
+                acked, self.acked = self.acked, None
+
+            if acked is not None:
+                self.snapshots.ack(acked)
+            try:
+                timed_send(self.conn, self.snapshots.encode(snap, self.pid), self.profiler)
+            except OSError:
+                return
+
+
+def client_thread(conn, pid, engine, cache, broadcaster=None, sender=None):
     print(f"[SERVER] Client thread started for player {pid}", flush=True)
 
+    reader = FrameDecoder()
+    snapshots = cache.encoder()
     while True:
         try:
-            data = conn.recv(1024)
-            if not data:
+            data = reader.read_frame(conn)
+            if data is None:
                 print(f"[SERVER] Player {pid} disconnected", flush=True)
                 break
-
-            actions = eval(data.decode())
-            engine.set_player_actions(pid, actions)
-
-            state = engine.get_game_state_data()
-            state["self"] = pid
-
-            conn.sendall(str(state).encode())
+            kind = message_type(data)
+            if kind == MSG_ACTIONS:
+                seq, tick, keys, ack = decode_actions(data)
+                engine.queue_input(pid, seq, tick, keys)
+            elif kind == MSG_ACK:
+                ack = decode_ack(data)
+            else:
+                continue
+
+            if sender is not None:
+                sender.ack(ack)
+                continue
+
+            snapshots.ack(ack)
+            timed_send(conn, snapshots.encode(cache.get(engine), pid), engine.profiler)
 
         except Exception as e:
             print(f"[SERVER] Error with player {pid}: {e}", flush=True)
             break
 
+    if sender is not None:
+        broadcaster.remove(sender)
+        sender.close()
     engine.remove_player(pid)
     conn.close()
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--npc-store", action="store_true",
+                        help="keep NPCs in NumPy arrays (needs numpy)")
+    parser.add_argument("--npcs", type=int, default=1,
+                        help="NPCs to spawn; beyond the first they start at random places")
+    parser.add_argument("--field", type=float, nargs=2, default=(600, 600),
+                        metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--regions", type=int, default=None,
+                        help="simulate NPCs in this many worker processes, one strip "
+                             "of the field each (needs numpy)")
+    parser.add_argument("--npc-collide", action="store_true",
+                        help="--regions: also push overlapping NPCs apart")
+    parser.add_argument("--mode", choices=("thread", "asyncio", "udp"), default="thread",
+                        help="one thread per client, one asyncio event loop, or UDP "
+                             "datagrams on one asyncio event loop")
+    parser.add_argument("--port", type=int, default=21002)
+    parser.add_argument("--push", action="store_true",
+                        help="broadcast state every few ticks instead of replying to input")
+    parser.add_argument("--send-rate", type=float, default=20,
+                        help="snapshots per second in --push mode")
+    parser.add_argument("--spin-ms", type=float, default=0.0,
+                        help="busy-wait this long before each tick deadline")
+    parser.add_argument("--tick-report", type=float, default=None, metavar="SECONDS",
+                        help="print the tick duration distribution this often")
+    parser.add_argument("--view-radius", type=float, default=None,
+                        help="only send each client what is this close to its player")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every tick phase; dump with SIGUSR1 or --admin-port")
+    parser.add_argument("--profile-slow-ms", type=float, default=None,
+                        help="keep ticks slower than this (and their stacks with --profile-stacks)")
+    parser.add_argument("--profile-stacks", action="store_true",
+                        help="sample the tick thread's Python stack during slow ticks")
+    parser.add_argument("--admin-port", type=int, default=None,
+                        help="localhost port that answers every connection with a profile dump")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="--mode udp: drop this fraction of outgoing datagrams")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="--mode udp: delay outgoing datagrams this long")
+    parser.add_argument("--jitter-ms", type=float, default=0.0,
+                        help="--mode udp: plus a random extra delay up to this long")
+    args = parser.parse_args()
+
     print("### SERVER FILE STARTED ###", flush=True)
 
-    field = GameField(0, 0, 600, 600)
-    engine = ServerGameEngine(field, [], [NPC(200, 200)])
+    field = GameField(0, 0, *args.field)
+    rng = random.Random(1)
+    npcs = [NPC(200, 200)] + [
+        NPC(rng.uniform(field.x_min, field.x_max), rng.uniform(field.y_min, field.y_max),
+            rng.choice((-2, 2)), rng.choice((-2, 2)))
+        for _ in range(args.npcs - 1)
+    ]
+    if args.regions:
+        from server.regions import RegionedNPCs
+        npcs = RegionedNPCs(field, npcs, args.regions, collide=args.npc_collide)
+    elif args.npc_store:
+        from games.npc_store import NPCStore
+        npcs = NPCStore.from_npcs(npcs)
+    scheduler = FixedTimestep(60, spin=args.spin_ms / 1000,
+                              report_interval=args.tick_report)
+    profiler = None
+    if args.profile:
+        profiler = TickProfiler(slow_ms=args.profile_slow_ms, sample_stacks=args.profile_stacks)
+        profiler.install_signal()
+        if args.admin_port is not None:
+            profiler.serve_admin(args.admin_port)
+    engine = ServerGameEngine(field, [], npcs, scheduler=scheduler, profiler=profiler)
+
+    cache = SnapshotCache(field, profiler=profiler, view_radius=args.view_radius)
+    broadcaster = None
+    if args.push:
+        broadcaster = Broadcaster(cache, engine.fps, args.send_rate)
+
+    try:
+        run_server(args, engine, cache, broadcaster)
+    finally:
+        # stops the region workers and frees their shared memory
+        if args.regions:
+            npcs.close()
+
+
+def run_server(args, engine, cache, broadcaster):
+    if args.mode == "asyncio":
+        main_async(engine, "0.0.0.0", args.port, cache, broadcaster)
+        return
+    if args.mode == "udp":
+        link = None
+        if args.loss or args.latency_ms or args.jitter_ms:
+            link = {"loss": args.loss, "latency": args.latency_ms / 1000,
+                    "jitter": args.jitter_ms / 1000}
+        main_udp(engine, "0.0.0.0", args.port, cache, broadcaster, link)
+        return
+
+    if broadcaster is not None:
+        engine.tick_listeners.append(broadcaster.on_tick)
 
     Thread(target=engine.run_game, daemon=True).start()
 
     s = socket.socket()
-    s.bind(("0.0.0.0", 21002))
+    s.bind(("0.0.0.0", args.port))
     s.listen()
 
-    print("[SERVER] Listening on port 21002...", flush=True)
+    print(f"[SERVER] Listening on port {args.port}...", flush=True)
 
     pid = 0
     while True:
@@ -56,9 +225,15 @@ def main():
         player = Player(pid, 100, 100)
         engine.add_player(player)
 
+        sender = None
+        if broadcaster is not None:
+            sender = PushSender(conn, pid, cache, engine.profiler)
+            broadcaster.add(sender)
+            Thread(target=sender.run, daemon=True).start()
+
         Thread(
             target=client_thread,
-            args=(conn, pid, engine),
+            args=(conn, pid, engine, cache, broadcaster, sender),
             daemon=True
         ).start()
 
@@ -0,0 +1,230 @@
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+clock = time.perf_counter
+
+
+class Histogram:
+    # Microsecond buckets, exact below 8us and four per power of two above
+    # that, so percentiles are within ~25% at a fixed, tiny memory cost.
+    BUCKETS = 8 + 4 * 28
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(us):
+        if us < 8:
+            return us
+        bits = us.bit_length()
+        return 8 + (bits - 4) * 4 + (us >> (bits - 3)) - 4
+
+    @staticmethod
+    def upper_bound(i):
+        if i < 8:
+            return i + 1
+        bits, quarter = divmod(i - 8, 4)
+        return (quarter + 5) << (bits + 1)
+
+    def add(self, seconds):
+        self.counts[min(self.bucket(int(seconds * 1_000_000)), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th sample, in seconds
+        target = p * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(self.upper_bound(i) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p90_ms": self.percentile(0.90) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class NullProfiler:
+    # what the engine uses when profiling is off: every hook is a no-op call
+    enabled = False
+
+    def begin(self, tick):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end(self):
+        pass
+
+    def record(self, phase, seconds):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class TickProfiler:
+    enabled = True
+
+    def __init__(self, ring_size=4096, window=10.0, slow_ms=None, sample_stacks=False):
+        self.window = window
+        self.slow = slow_ms / 1000 if slow_ms else None
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.windows = {}
+        self.previous = {}
+        self.window_start = clock()
+
+        # one (tick, total seconds, {phase: seconds}) entry per tick
+        self.ring = deque(maxlen=ring_size)
+        self.slow_ticks = deque(maxlen=64)
+
+        self.tick = None
+        self.tick_start = None
+        self.last_mark = None
+        self.phases = None
+        self.tick_thread = None
+
+        self.stacks = deque(maxlen=64)
+        if sample_stacks and self.slow:
+            threading.Thread(target=self._sample_stacks, daemon=True).start()
+
+    def _add(self, phase, seconds):
+        for table in (self.totals, self.windows):
+            h = table.get(phase)
+            if h is None:
+                h = table[phase] = Histogram()
+            h.add(seconds)
+
+    def _rotate(self, now):
+        if now - self.window_start >= self.window:
+            self.previous = self.windows
+            self.windows = {}
+            self.window_start = now
+
+    def begin(self, tick):
+        self.tick_thread = threading.get_ident()
+        self.tick = tick
+        self.phases = {}
+        self.tick_start = self.last_mark = clock()
+
+    def mark(self, phase):
+        now = clock()
+        self.phases[phase] = now - self.last_mark
+        self.last_mark = now
+
+    def end(self):
+        now = clock()
+        total = now - self.tick_start
+        with self.lock:
+            self._rotate(now)
+            for phase, seconds in self.phases.items():
+                self._add(phase, seconds)
+            self._add("tick", total)
+        self.ring.append((self.tick, total, self.phases))
+        if self.slow and total > self.slow:
+            self.slow_ticks.append((self.tick, total, self.phases))
+        self.tick_start = None
+
+    def record(self, phase, seconds):
+        # for work done outside the tick thread (serialization, sockets)
+        with self.lock:
+            self._add(phase, seconds)
+
+    def _sample_stacks(self):
+        # watchdog: if a tick runs past the slow threshold, grab the tick
+        # thread's Python stack once so we can see where it is stuck
+        sampled = None
+        while True:
+            time.sleep(self.slow / 4)
+            start, tick = self.tick_start, self.tick
+            if start is None or tick == sampled or clock() - start < self.slow:
+                continue
+            frame = sys._current_frames().get(self.tick_thread)
+            if frame is not None:
+                self.stacks.append({
+                    "tick": tick,
+                    "elapsed_ms": (clock() - start) * 1000,
+                    "stack": traceback.format_stack(frame),
+                })
+                sampled = tick
+
+    def dump(self, recent=60):
+        with self.lock:
+            report = {
+                "since_start": {k: h.summary() for k, h in self.totals.items()},
+                "window": {k: h.summary() for k, h in self.windows.items()},
+                "previous_window": {k: h.summary() for k, h in self.previous.items()},
+            }
+        report["window_s"] = self.window
+        report["recent_ticks"] = [
+            {"tick": tick, "total_ms": total * 1000,
+             "phases_ms": {k: v * 1000 for k, v in phases.items()}}
+            for tick, total, phases in list(self.ring)[-recent:]
+        ]
+        report["slow_ticks"] = [
+            {"tick": tick, "total_ms": total * 1000,
+             "phases_ms": {k: v * 1000 for k, v in phases.items()}}
+            for tick, total, phases in list(self.slow_ticks)
+        ]
+        report["slow_tick_stacks"] = list(self.stacks)
+        return report
+
+    def dump_json(self):
+        return json.dumps(self.dump(), indent=2)
+
+    def install_signal(self, signum=None):
+        # kill -USR1 <pid> prints a dump to stderr (POSIX only). The handler
+        # runs on the main thread, which may be the tick thread holding
+        # self.lock, so it only pokes a pipe and a helper thread dumps
+        signum = signum or getattr(signal, "SIGUSR1", None)
+        if signum is None:
+            return False
+        r, w = os.pipe()
+
+        def dump_on_request():
+            while os.read(r, 1):
+                print(self.dump_json(), file=sys.stderr, flush=True)
+
+        threading.Thread(target=dump_on_request, daemon=True).start()
+        signal.signal(signum, lambda *_: os.write(w, b"\0"))
+        return True
+
+    def serve_admin(self, port, host="127.0.0.1"):
+        # connect to host:port (e.g. nc 127.0.0.1 PORT) to receive a JSON dump
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen()
+
+        def serve():
+            while True:
+                conn, _ = sock.accept()
+                with conn:
+                    conn.sendall(self.dump_json().encode() + b"\n")
+
+        threading.Thread(target=serve, daemon=True).start()
+        return sock
@@ -0,0 +1,232 @@
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from games.game_field import GameField
+from games.npc_store import NPCStore
+from games.spatial_hash import SpatialHash
+
+# One world, many processes: the field is cut into vertical strips and each
+# strip's NPCs are simulated by its own worker process. All NPC state lives in
+# one shared memory block, so nothing is serialized between processes; workers
+# only ever write the slots of NPCs they own, and three barrier-separated
+# phases per tick keep everyone's reads consistent:
+#
+#   1. move        owned NPCs step and bounce off the field edges
+#   2. separate    overlapping NPCs compute a push apart, reading owned NPCs
+#                  and "ghosts" (other strips' NPCs within reach of the border)
+#   3. apply       owned NPCs take their push, and any that ended up in
+#                  another strip are handed off by rewriting their owner
+#
+# Phase 2 reads every position but writes only pushes, and sums each NPC's
+# contacts in index order, so the result is the same for any region count.
+# Separation is off unless asked for (collide=True): the list and NPCStore
+# paths don't have it, and splitting the world must not change how it plays.
+FLOATS = ("x", "y", "speed_x", "speed_y", "push_x", "push_y", "size")
+
+
+def _views(buf, capacity):
+    arrays = {}
+    offset = 0
+    for name in FLOATS:
+        arrays[name] = np.ndarray(capacity, dtype=np.float64, buffer=buf, offset=offset)
+        offset += capacity * 8
+    arrays["owner"] = np.ndarray(capacity, dtype=np.int32, buffer=buf, offset=offset)
+    return arrays
+
+
+def _block_size(capacity):
+    return capacity * (8 * len(FLOATS) + 4)
+
+
+class Strips:
+    def __init__(self, game_field, regions):
+        self.game_field = game_field
+        self.regions = regions
+        self.width = (game_field.x_max - game_field.x_min) / regions
+
+    def bounds(self, r):
+        x0 = self.game_field.x_min + r * self.width
+        return x0, x0 + self.width
+
+    def region_of(self, x):
+        r = ((x - self.game_field.x_min) // self.width).astype(np.int32)
+        return np.clip(r, 0, self.regions - 1, out=r)
+
+
+def separate(a, r, own, ghosts, reach):
+    # resolve_collision from circle_game, made order-independent: every NPC
+    # is pushed half the overlap away from each NPC it touches, measured on
+    # positions nobody is writing during this phase
+    ids = np.sort(np.concatenate((own, ghosts)))
+    x, y, size = a["x"][ids].tolist(), a["y"][ids].tolist(), a["size"][ids].tolist()
+
+    # grid keys are positions in ids, which is sorted, so visiting contacts
+    # in key order is visiting them in global index order
+    grid = SpatialHash(GameField(0, 0, 0, 0), reach)
+    for k in range(len(ids)):
+        grid.insert(k, x[k], y[k])
+
+    mine = np.flatnonzero(a["owner"][ids] == r)
+    pushes_x, pushes_y = [], []
+    for i in mine.tolist():
+        xi, yi, ri = x[i], y[i], size[i] / 2
+        px = py = 0.0
+        for j in sorted(grid.query(xi, yi, reach)):
+            if j == i:
+                continue
+            dx, dy = xi - x[j], yi - y[j]
+            dist = (dx * dx + dy * dy) ** 0.5
+            overlap = ri + size[j] / 2 - dist
+            if overlap > 0 and dist:
+                px += dx / dist * overlap / 2
+                py += dy / dist * overlap / 2
+        pushes_x.append(px)
+        pushes_y.append(py)
+    a["push_x"][ids[mine]] = pushes_x
+    a["push_y"][ids[mine]] = pushes_y
+
+
+def region_worker(name, capacity, count, r, strips, margin, collide, start, phase, done):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        a = _views(shm.buf, capacity)
+        views = {key: arr[:count] for key, arr in a.items()}
+        x, y = views["x"], views["y"]
+        speed_x, speed_y = views["speed_x"], views["speed_y"]
+        owner = views["owner"]
+        f = strips.game_field
+        x0, x1 = strips.bounds(r)
+        reach = float(views["size"].max()) if count else 1.0
+
+        while True:
+            start.wait()
+            own = np.flatnonzero(owner == r)
+
+            # 1. move
+            ox, oy = x[own] + speed_x[own], y[own] + speed_y[own]
+            hit_x = (ox < f.x_min) | (ox > f.x_max)
+            hit_y = (oy < f.y_min) | (oy > f.y_max)
+            x[own] = np.clip(ox, f.x_min, f.x_max)
+            y[own] = np.clip(oy, f.y_min, f.y_max)
+            speed_x[own] = np.where(hit_x, -speed_x[own], speed_x[own])
+            speed_y[own] = np.where(hit_y, -speed_y[own], speed_y[own])
+            phase.wait()
+
+            # 2. separate
+            if collide:
+                ghosts = np.flatnonzero((owner != r) & (x >= x0 - margin) & (x < x1 + margin))
+                separate(views, r, own, ghosts, reach)
+            phase.wait()
+
+            # 3. apply, hand off
+            if collide:
+                x[own] = np.clip(x[own] + views["push_x"][own], f.x_min, f.x_max)
+                y[own] = np.clip(y[own] + views["push_y"][own], f.y_min, f.y_max)
+            owner[own] = strips.region_of(x[own])
+            done.wait()
+    except threading.BrokenBarrierError:
+        pass
+    finally:
+        # numpy views pin the buffer; drop them before closing it
+        a = views = x = y = speed_x = speed_y = owner = None
+        shm.close()
+
+
+class RegionedNPCs:
+    # Stands in for an NPCStore in ServerGameEngine: move() runs one tick on
+    # the region workers, copy() takes a private snapshot for publishing.
+    def __init__(self, game_field, npcs, regions=None, collide=False, timeout=5.0):
+        regions = regions or multiprocessing.cpu_count()
+        # longest a tick may wait on the workers before we call them stuck
+        self.timeout = timeout
+        self.strips = Strips(game_field, regions)
+        self.count = len(npcs)
+        capacity = max(self.count, 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=_block_size(capacity))
+        a = self.arrays = _views(self.shm.buf, capacity)
+
+        store = npcs if isinstance(npcs, NPCStore) else NPCStore.from_npcs(npcs)
+        n = self.count
+        a["x"][:n] = store.x
+        a["y"][:n] = store.y
+        a["speed_x"][:n] = store.speed_x
+        a["speed_y"][:n] = store.speed_y
+        a["size"][:n] = store.size
+        a["owner"][:n] = self.strips.region_of(a["x"][:n])
+
+        # ghosts must cover anything an owned NPC can touch after one step
+        margin = 0.0
+        if n:
+            margin = (float(np.abs(store.speed_x).max()) + float(np.abs(store.speed_y).max())
+                      + float(store.size.max()))
+
+        # all three are kept: a barrier's shared state is freed, and its
+        # memory reused, once the parent drops its last reference
+        self.start = multiprocessing.Barrier(regions + 1)
+        self.done = multiprocessing.Barrier(regions + 1)
+        self.phase = multiprocessing.Barrier(regions)
+        self.workers = [
+            multiprocessing.Process(
+                target=region_worker,
+                args=(self.shm.name, capacity, n, r, self.strips, margin, collide,
+                      self.start, self.phase, self.done),
+                daemon=True,
+            )
+            for r in range(regions)
+        ]
+        for w in self.workers:
+            w.start()
+
+    def __len__(self):
+        return self.count
+
+    def dead_workers(self):
+        return [r for r, w in enumerate(self.workers) if not w.is_alive()]
+
+    def move(self, game_field):
+        # the field was fixed when the strips were cut. A worker that died
+        # between ticks is still counted as asleep in the start barrier, and
+        # breaking the barrier waits for it to wake, so look before waiting
+        dead = self.dead_workers()
+        if dead:
+            raise RuntimeError(f"region workers {dead} died")
+        try:
+            self.start.wait(self.timeout)
+            self.done.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            raise RuntimeError(f"region workers stuck (dead: {self.dead_workers() or 'none'})") \
+                from None
+
+    def copy(self):
+        store = NPCStore(max(self.count, 1))
+        n = store.count = self.count
+        a = self.arrays
+        store._x[:n] = a["x"][:n]
+        store._y[:n] = a["y"][:n]
+        store._speed_x[:n] = a["speed_x"][:n]
+        store._speed_y[:n] = a["speed_y"][:n]
+        store._size[:n] = a["size"][:n]
+        return store
+
+    def positions(self):
+        return self.copy().positions()
+
+    def owners(self):
+        return self.arrays["owner"][:self.count].copy()
+
+    def close(self):
+        if self.dead_workers():
+            # aborting would wait on the dead ones; stop the rest outright
+            for w in self.workers:
+                w.terminate()
+        else:
+            self.start.abort()
+            self.done.abort()
+        for w in self.workers:
+            w.join()
+        del self.arrays
+        self.shm.close()
+        self.shm.unlink()
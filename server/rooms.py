@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import selectors
+import socket
+import struct
+
+from games.characters import Player, NPC
+from games.game_field import GameField
+from games.protocol import ANY_ROOM, FrameDecoder, encode_room
+from games.snapshot import SnapshotCache
+from server.async_net_game_serv import AsyncClient
+from server.broadcast import Broadcaster
+from server.server_game_engine import ServerGameEngine
+
+# The lobby (this process) accepts connections and hands each socket to the
+# worker process that owns the chosen room, over a unix socketpair with the
+# fd attached (POSIX only). Workers run their rooms on one asyncio loop each;
+# a room never shares a GIL with rooms on other workers.
+CONTROL = struct.Struct("<BiII")    # kind, pid, room, target room
+ASSIGN = 1      # lobby -> worker, with fd: put pid into room
+LEFT = 2        # worker -> lobby: pid disconnected from room
+MOVED = 3       # worker -> lobby: pid went from room to target on the same worker
+HANDOFF = 4     # worker -> lobby, with fd: pid in room asked for target
+
+# control messages carry input the old owner had already read off the socket
+MAX_CONTROL = 256 * 1024
+
+
+def send_control(ctrl, kind, pid, room, target=0, pending=b"", fd=None):
+    msg = CONTROL.pack(kind, pid, room, target) + pending
+    socket.send_fds(ctrl, [msg], [] if fd is None else [fd])
+
+
+class Room:
+    def __init__(self, room_id, game_field, push=False, send_rate=20, view_radius=None):
+        self.id = room_id
+        self.engine = ServerGameEngine(game_field, [], [NPC(200, 200)])
+        self.cache = SnapshotCache(game_field, view_radius=view_radius)
+        self.broadcaster = None
+        if push:
+            self.broadcaster = Broadcaster(self.cache, self.engine.fps, send_rate)
+            self.engine.tick_listeners.append(self.broadcaster.on_tick)
+
+    async def play(self, pid, reader, writer, frames):
+        # returns the room the player asked to join, or None on disconnect
+        engine = self.engine
+        engine.add_player(Player(pid, 100, 100))
+        client = AsyncClient(pid, reader, writer, engine, self.cache,
+                             reply=self.broadcaster is None, frames=frames, rooms=True)
+        # tells the client to drop its delta baselines from the previous room
+        writer.write(encode_room(self.id))
+        if self.broadcaster is not None:
+            self.broadcaster.add(client)
+        try:
+            return await client.run()
+        except (ConnectionError, ValueError) as e:
+            print(f"[ROOM {self.id}] Error with player {pid}: {e}", flush=True)
+            return None
+        finally:
+            if self.broadcaster is not None:
+                self.broadcaster.remove(client)
+            engine.remove_player(pid)
+
+
+class RoomWorker:
+    def __init__(self, ctrl, rooms):
+        self.ctrl = ctrl
+        self.rooms = {room.id: room for room in rooms}
+        # the loop only keeps weak references to tasks
+        self.connections = set()
+
+    async def serve(self):
+        ticks = [asyncio.create_task(room.engine.run_game_async())
+                 for room in self.rooms.values()]
+        self.ctrl.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.ctrl.fileno(), self.on_control)
+        try:
+            await asyncio.gather(*ticks)
+        finally:
+            for t in ticks:
+                t.cancel()
+
+    def on_control(self):
+        while True:
+            try:
+                msg, fds, _, _ = socket.recv_fds(self.ctrl, MAX_CONTROL, 1)
+            except BlockingIOError:
+                return
+            kind, pid, room_id, _ = CONTROL.unpack_from(msg)
+            if kind == ASSIGN and fds:
+                sock = socket.socket(fileno=fds[0])
+                task = asyncio.create_task(self.attach(sock, pid, room_id, msg[CONTROL.size:]))
+                self.connections.add(task)
+                task.add_done_callback(self.connections.discard)
+
+    async def attach(self, sock, pid, room_id, pending):
+        reader, writer = await asyncio.open_connection(sock=sock)
+        frames = FrameDecoder()
+        frames.feed(pending)
+
+        room = self.rooms[room_id]
+        while True:
+            print(f"[ROOM {room.id}] Player {pid} joined", flush=True)
+            target = await room.play(pid, reader, writer, frames)
+            if target is None:
+                print(f"[ROOM {room.id}] Player {pid} disconnected", flush=True)
+                send_control(self.ctrl, LEFT, pid, room.id)
+                writer.close()
+                return
+            if target == room.id:
+                continue
+            if target in self.rooms:
+                send_control(self.ctrl, MOVED, pid, room.id, target)
+                room = self.rooms[target]
+                continue
+            # another worker's room, or "anywhere": the lobby decides
+            await self.handoff(pid, room, target, reader, writer, frames)
+            return
+
+    async def handoff(self, pid, room, target, reader, writer, frames):
+        # flush everything already queued for this client so the new owner's
+        # frames cannot interleave with ours, then stop reading
+        writer.transport.set_write_buffer_limits(0)
+        await writer.drain()
+        writer.transport.pause_reading()
+
+        # StreamReader has no public way to take what it has already buffered
+        pending = frames.pending() + bytes(reader._buffer)
+        fd = os.dup(writer.get_extra_info("socket").fileno())
+        writer.transport.abort()
+        try:
+            send_control(self.ctrl, HANDOFF, pid, room.id, target, pending, fd)
+        finally:
+            os.close(fd)
+
+
+def run_worker(ctrl, room_ids, game_field, push, send_rate, view_radius):
+    rooms = [Room(room_id, game_field, push, send_rate, view_radius) for room_id in room_ids]
+    asyncio.run(RoomWorker(ctrl, rooms).serve())
+
+
+class Lobby:
+    # Routes new connections to the least loaded room that has space, and
+    # moves players between rooms on request. Load is the player count the
+    # lobby has assigned minus the departures workers report.
+    def __init__(self, room_size):
+        self.room_size = room_size
+        self.owner = {}     # room id -> control socket of its worker
+        self.load = {}      # room id -> players
+        self.next_pid = 0
+
+    def add_worker(self, ctrl, room_ids):
+        for room_id in room_ids:
+            self.owner[room_id] = ctrl
+            self.load[room_id] = 0
+
+    def route(self, exclude=None):
+        open_rooms = [r for r, n in self.load.items() if n < self.room_size and r != exclude]
+        if not open_rooms:
+            return None
+        return min(open_rooms, key=self.load.__getitem__)
+
+    def assign(self, sock_fd, pid, room_id, pending=b""):
+        self.load[room_id] += 1
+        send_control(self.owner[room_id], ASSIGN, pid, room_id, 0, pending, sock_fd)
+
+    def on_connect(self, listener):
+        conn, addr = listener.accept()
+        with conn:
+            room_id = self.route()
+            if room_id is None:
+                print(f"[LOBBY] All rooms full, turning away {addr}", flush=True)
+                return
+            self.next_pid += 1
+            print(f"[LOBBY] Player {self.next_pid} from {addr} -> room {room_id}", flush=True)
+            self.assign(conn.fileno(), self.next_pid, room_id)
+
+    def on_control(self, ctrl):
+        msg, fds, _, _ = socket.recv_fds(ctrl, MAX_CONTROL, 1)
+        kind, pid, room_id, target = CONTROL.unpack_from(msg)
+        self.load[room_id] -= 1
+
+        if kind == MOVED:
+            self.load[target] += 1
+        elif kind == HANDOFF:
+            fd = fds[0]
+            try:
+                if target == ANY_ROOM or target not in self.load or \
+                        self.load[target] >= self.room_size:
+                    target = self.route(exclude=room_id)
+                if target is None:
+                    # nowhere to go: back where it came from
+                    target = room_id
+                print(f"[LOBBY] Player {pid} room {room_id} -> {target}", flush=True)
+                self.assign(fd, pid, target, msg[CONTROL.size:])
+            finally:
+                os.close(fd)
+
+    def run(self, listener):
+        sel = selectors.DefaultSelector()
+        sel.register(listener, selectors.EVENT_READ, self.on_connect)
+        for ctrl in set(self.owner.values()):
+            sel.register(ctrl, selectors.EVENT_READ, self.on_control)
+        while True:
+            for key, _ in sel.select():
+                key.data(key.fileobj)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="many rooms over a pool of worker processes")
+    parser.add_argument("--port", type=int, default=21002)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rooms-per-worker", type=int, default=4)
+    parser.add_argument("--room-size", type=int, default=32,
+                        help="players per room before the lobby routes elsewhere")
+    parser.add_argument("--push", action="store_true",
+                        help="broadcast state every few ticks instead of replying to input")
+    parser.add_argument("--send-rate", type=float, default=20,
+                        help="snapshots per second in --push mode")
+    parser.add_argument("--view-radius", type=float, default=None,
+                        help="only send each client what is this close to its player")
+    args = parser.parse_args()
+
+    field = GameField(0, 0, 600, 600)
+    lobby = Lobby(args.room_size)
+    for w in range(args.workers):
+        room_ids = [w * args.rooms_per_worker + i for i in range(args.rooms_per_worker)]
+        ctrl, worker_ctrl = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        multiprocessing.Process(
+            target=run_worker,
+            args=(worker_ctrl, room_ids, field, args.push, args.send_rate, args.view_radius),
+            daemon=True,
+        ).start()
+        worker_ctrl.close()
+        lobby.add_worker(ctrl, room_ids)
+
+    s = socket.socket()
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind(("0.0.0.0", args.port))
+    s.listen(1024)
+    print(f"[LOBBY] {len(lobby.load)} rooms on {args.workers} workers, "
+          f"listening on port {args.port}...", flush=True)
+    lobby.run(s)
+
+
+if __name__ == "__main__":
+    main()
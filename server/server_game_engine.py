@@ -1,48 +1,170 @@
-import time
+import asyncio
+import threading
+from array import array
+from collections import deque
+
+from server.profiler import NULL_PROFILER
+from server.tick_scheduler import FixedTimestep
+from server.world_state import WorldSnapshot
 
 class ServerGameEngine:
-    def __init__(self, game_field, players, npcs, fps=60):
+    # changes a client sends faster than we tick are applied one per tick;
+    # past this many queued, the oldest are dropped rather than lag behind
+    INPUT_QUEUE = 8
+
+    def __init__(self, game_field, players, npcs, fps=60, scheduler=None, profiler=None):
         self.game_field = game_field
         self.players = players
         self.npcs = npcs
         self.fps = fps
-        self.actions_for_players = {}
+        self.scheduler = scheduler or FixedTimestep(fps)
+        self.profiler = profiler or NULL_PROFILER
+        self.tick = 0
+        self.tick_listeners = []
+
+        # Per-player input, in flat arrays indexed by a slot the player keeps
+        # for as long as it is connected; self.player_slots runs parallel to
+        # self.players. Clients only send input when it changes, tagged with
+        # a sequence number and the client tick it starts on. Changes wait in
+        # a per-slot queue, and the held input is applied on every tick in
+        # between, each tick counting as the client's next tick.
+        self.inputs = array("B")        # held games.keys bitmask
+        self.input_seqs = array("I")    # seq of the held input, 0 before any
+        self.input_ticks = array("I")   # client tick the last move was for
+        self.queued_seqs = array("I")   # newest seq queued, to drop repeats
+        self.input_queues = []          # deque of (seq, client tick, keys)
+        self.slots = {}         # pid -> slot, for client threads
+        self.free_slots = []
+        self.slot_lock = threading.Lock()
+        self.player_slots = [self.claim_slot(p.id) for p in players]
+
+        # joins/leaves from client threads, applied by the tick thread only
+        self.pending = deque()
+        self.front = None
+        self.publish()
+
+    def claim_slot(self, pid):
+        with self.slot_lock:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            else:
+                slot = len(self.inputs)
+                for a in (self.inputs, self.input_seqs, self.input_ticks, self.queued_seqs):
+                    a.append(0)
+                self.input_queues.append(deque(maxlen=self.INPUT_QUEUE))
+            self.inputs[slot] = self.input_seqs[slot] = self.input_ticks[slot] = 0
+            self.queued_seqs[slot] = 0
+            self.input_queues[slot].clear()
+            self.slots[pid] = slot
+            return slot
 
-    def set_player_actions(self, pid, actions):
-        self.actions_for_players[pid] = actions
+    def queue_input(self, pid, seq, client_tick, keys):
+        slot = self.slots.get(pid)
+        if slot is not None and seq > self.queued_seqs[slot]:
+            self.queued_seqs[slot] = seq
+            self.input_queues[slot].append((seq, client_tick, keys))
+
+    def input_ack(self, slot):
+        # what a snapshot tells its client: the last input seq applied and
+        # the client tick our latest move corresponds to
+        return self.input_seqs[slot], self.input_ticks[slot]
 
     def add_player(self, player):
-        self.players.append(player)
+        self.pending.append(("add", (player, self.claim_slot(player.id))))
 
     def remove_player(self, pid):
-        self.players = [p for p in self.players if p.id != pid]
+        # input stops landing now; the slot is only reused once the tick
+        # thread has dropped the player
+        with self.slot_lock:
+            self.slots.pop(pid, None)
+        self.pending.append(("remove", pid))
+
+    def apply_pending(self):
+        while self.pending:
+            op, arg = self.pending.popleft()
+            if op == "add":
+                player, slot = arg
+                self.players.append(player)
+                self.player_slots.append(slot)
+                continue
+            players, slots, freed = [], [], []
+            for p, slot in zip(self.players, self.player_slots):
+                if p.id == arg:
+                    freed.append(slot)
+                else:
+                    players.append(p)
+                    slots.append(slot)
+            self.players, self.player_slots = players, slots
+            with self.slot_lock:
+                self.free_slots.extend(freed)
+
+    def move_npcs(self):
+        # self.npcs is either a list of NPC objects, a games.npc_store.NPCStore
+        # or a server.regions.RegionedNPCs, which both work on whole arrays
+        if isinstance(self.npcs, list):
+            for npc in self.npcs:
+                npc.move(self.game_field)
+        else:
+            self.npcs.move(self.game_field)
+
+    def publish(self):
+        if isinstance(self.npcs, list):
+            npcs = [(n.x, n.y) for n in self.npcs]
+        else:
+            npcs = self.npcs.copy()
+        players = {p.id: (p.x, p.y, p.score) for p in self.players}
+        input_acks = {p.id: self.input_ack(slot)
+                      for p, slot in zip(self.players, self.player_slots)}
+        self.front = WorldSnapshot(self.tick, players, npcs, input_acks)
 
     def get_game_state_data(self):
-        return {
-            "players": {
-                p.id: (p.x, p.y, p.score)
-                for p in self.players
-            },
-            "npcs": [(n.x, n.y) for n in self.npcs]
-        }
+        # always the last finished tick; callers must treat it as read-only
+        return self.front.state()
+
+    def move_players(self):
+        inputs, seqs, ticks = self.inputs, self.input_seqs, self.input_ticks
+        queues = self.input_queues
+        game_field = self.game_field
+        for p, slot in zip(self.players, self.player_slots):
+            queue = queues[slot]
+            if queue:
+                seqs[slot], ticks[slot], inputs[slot] = queue.popleft()
+            else:
+                ticks[slot] += 1
+            p.move(inputs[slot], game_field)
 
     def update_state(self):
-        for npc in self.npcs:
-            npc.move(self.game_field)
-
-        for p in self.players:
-            a = self.actions_for_players.get(p.id, {})
-            p.move(
-                a.get("left", False),
-                a.get("right", False),
-                a.get("up", False),
-                a.get("down", False),
-                False,
-                self.game_field
-            )
+        prof = self.profiler
+        prof.begin(self.tick + 1)
+
+        self.apply_pending()
+        prof.mark("pending")
+
+        self.tick += 1
+        self.move_npcs()
+        prof.mark("npcs")
+
+        self.move_players()
+        prof.mark("players")
+
+        self.publish()
+        prof.mark("publish")
+
+        for listener in self.tick_listeners:
+            listener(self)
+        prof.mark("listeners")
+
+        prof.end()
 
     def run_game(self):
         print("[SERVER] Game loop running")
+        self.scheduler.run(self.update_state)
+
+    async def run_game_async(self):
+        print("[SERVER] Game loop running (asyncio)")
+        scheduler = self.scheduler
+        scheduler.start()
         while True:
-            self.update_state()
-            time.sleep(1 / self.fps)
+            for _ in range(scheduler.due()):
+                scheduler.run_tick(self.update_state)
+            await asyncio.sleep(scheduler.delay())
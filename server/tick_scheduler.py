@@ -0,0 +1,98 @@
+import time
+from collections import deque
+
+clock = time.perf_counter   # monotonic, highest available resolution
+
+
+class FixedTimestep:
+    def __init__(self, fps, max_catch_up=5, spin=0.0, history=1024, report_interval=None):
+        self.step = 1 / fps
+        self.max_catch_up = max_catch_up
+        self.spin = spin                        # seconds to busy-wait before each deadline
+        self.report_interval = report_interval
+        self.durations = deque(maxlen=history)
+        self.ticks = 0
+        self.overruns = 0                       # ticks that took longer than one step
+        self.skipped = 0                        # ticks given up on after a long stall
+        self.next_tick = None
+        self.next_report = None
+
+    def start(self):
+        self.next_tick = clock()
+        if self.report_interval:
+            self.next_report = self.next_tick + self.report_interval
+
+    def due(self):
+        # how many ticks are owed right now (the accumulator, in whole steps)
+        behind = clock() - self.next_tick
+        if behind < 0:
+            return 0
+        n = int(behind / self.step) + 1
+        if n > self.max_catch_up:
+            # too far behind to catch up without a burst; drop the backlog so
+            # the simulation slows down for a moment instead of spiralling
+            self.skipped += n - self.max_catch_up
+            self.next_tick += (n - self.max_catch_up) * self.step
+            n = self.max_catch_up
+        return n
+
+    def run_tick(self, update):
+        start = clock()
+        update()
+        duration = clock() - start
+
+        self.durations.append(duration)
+        self.ticks += 1
+        if duration > self.step:
+            self.overruns += 1
+        self.next_tick += self.step
+
+        if self.next_report is not None and start >= self.next_report:
+            print(f"[SERVER] {self.report()}", flush=True)
+            self.next_report = start + self.report_interval
+
+    def delay(self):
+        return max(0.0, self.next_tick - clock())
+
+    def wait(self):
+        remaining = self.next_tick - clock()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while clock() < self.next_tick:
+            pass
+
+    def run(self, update):
+        self.start()
+        while True:
+            for _ in range(self.due()):
+                self.run_tick(update)
+            self.wait()
+
+    def stats(self):
+        durations = sorted(self.durations)
+        if not durations:
+            return {"ticks": self.ticks, "overruns": self.overruns, "skipped": self.skipped}
+
+        def pct(p):
+            return durations[min(len(durations) - 1, int(p * len(durations)))]
+
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "mean": sum(durations) / len(durations),
+            "p50": pct(0.50),
+            "p90": pct(0.90),
+            "p99": pct(0.99),
+            "max": durations[-1],
+        }
+
+    def report(self):
+        s = self.stats()
+        if "mean" not in s:
+            return f"ticks={s['ticks']}"
+        return (
+            f"ticks={s['ticks']} overruns={s['overruns']} skipped={s['skipped']} "
+            f"tick ms p50={s['p50'] * 1000:.2f} p90={s['p90'] * 1000:.2f} "
+            f"p99={s['p99'] * 1000:.2f} max={s['max'] * 1000:.2f}"
+        )
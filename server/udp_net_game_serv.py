@@ -0,0 +1,185 @@
+import asyncio
+import secrets
+import struct
+import time
+
+from games.characters import Player
+from games.protocol import (
+    FRAME_HEADER, MSG_ACK, MSG_ACTIONS, MSG_BYE, MSG_HELLO, decode_ack, decode_actions,
+)
+from games.udp import (
+    MAX_DATAGRAM, LinkSimulator, ReliableChannel, decode_hello, decode_packet, encode_packet,
+    encode_welcome,
+)
+
+clock = time.perf_counter
+
+
+class UdpPeer:
+    # one client of the UDP server; has push() like AsyncClient, so the
+    # Broadcaster can drive it
+    def __init__(self, server, token, pid, addr, nonce):
+        self.server = server
+        self.token = token
+        self.pid = pid
+        self.addr = addr
+        self.nonce = nonce
+        self.channel = ReliableChannel(server.resend)
+        self.snapshots = server.cache.encoder()
+        self.last_heard = clock()
+
+    def push(self, snap):
+        parts = self.snapshots.encode(snap, self.pid)
+        # datagrams have their own boundaries; drop the frame length
+        parts[0] = parts[0][FRAME_HEADER.size:]
+        self.server.send(self, b"".join(parts))
+
+
+class UdpGameServer(asyncio.DatagramProtocol):
+    def __init__(self, engine, cache, broadcaster=None, link=None, resend=0.05, timeout=5.0):
+        self.engine = engine
+        self.cache = cache
+        self.broadcaster = broadcaster
+        # keyword arguments for LinkSimulator; None sends straight out
+        self.link_options = link
+        self.resend = resend
+        self.timeout = timeout
+        self.transport = None
+        self.link = None
+        self.peers = {}         # token -> UdpPeer
+        self.hellos = {}        # (addr, nonce) -> UdpPeer, so a resent hello is answered again
+        self.next_pid = 0
+        self.oversized = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.link_options:
+            self.link = LinkSimulator(transport.sendto, call_later=asyncio.get_running_loop().call_later,
+                                      **self.link_options)
+
+    def sendto(self, data, addr):
+        if len(data) > MAX_DATAGRAM:
+            self.oversized += 1
+            if self.oversized == 1:
+                print(f"[SERVER] Dropping {len(data)} byte snapshots, too big for a datagram; "
+                      f"try --view-radius", flush=True)
+            return
+        if self.link is not None:
+            self.link.send(data, addr)
+        else:
+            self.transport.sendto(data, addr)
+
+    def send(self, peer, payload=b""):
+        self.sendto(encode_packet(peer.token, peer.channel, payload), peer.addr)
+
+    def datagram_received(self, data, addr):
+        try:
+            token, ack, messages, payload = decode_packet(data)
+        except struct.error:
+            return
+        if token == 0:
+            if payload[:1] == bytes((MSG_HELLO,)):
+                self.on_hello(payload, addr)
+            return
+
+        peer = self.peers.get(token)
+        if peer is None:
+            return
+        # the token vouches for the sender, so follow it to a new address
+        peer.addr = addr
+        peer.last_heard = clock()
+
+        peer.channel.on_ack(ack)
+        try:
+            for seq, message in messages:
+                for delivered in peer.channel.receive(seq, message):
+                    self.on_message(peer, delivered)
+        except (struct.error, IndexError) as e:
+            # the message is already counted as delivered and can't be
+            # asked for again, so the peer's input stream is broken
+            self.drop(peer, f"sent a bad message: {e!r}")
+        if peer.token not in self.peers:
+            return
+
+        if payload[:1] == bytes((MSG_ACK,)):
+            try:
+                peer.snapshots.ack(decode_ack(payload))
+            except struct.error:
+                pass    # unreliable, so just as if it had been lost
+
+        if self.broadcaster is None:
+            peer.push(self.cache.get(self.engine))
+        elif messages:
+            # ack right away, or the client keeps resending until the next push
+            self.send(peer)
+
+    def on_hello(self, payload, addr):
+        try:
+            nonce = decode_hello(payload)
+        except struct.error:
+            return
+        peer = self.hellos.get((addr, nonce))
+        if peer is None:
+            token = 0
+            while not token or token in self.peers:
+                token = secrets.randbits(32)
+            self.next_pid += 1
+            peer = UdpPeer(self, token, self.next_pid, addr, nonce)
+            self.peers[token] = peer
+            self.hellos[(addr, nonce)] = peer
+            print(f"[SERVER] Player {peer.pid} connected from {addr} (udp)", flush=True)
+            self.engine.add_player(Player(peer.pid, 100, 100))
+            if self.broadcaster is not None:
+                self.broadcaster.add(peer)
+        self.sendto(encode_packet(peer.token, payload=encode_welcome(nonce, peer.token, peer.pid)),
+                    addr)
+
+    def on_message(self, peer, payload):
+        kind = payload[0]
+        if kind == MSG_ACTIONS:
+            seq, tick, keys, ack = decode_actions(payload)
+            self.engine.queue_input(peer.pid, seq, tick, keys)
+            peer.snapshots.ack(ack)
+        elif kind == MSG_BYE:
+            # ack the bye so the client can stop waiting for it
+            self.send(peer)
+            self.drop(peer, "disconnected")
+
+    def drop(self, peer, why):
+        if self.peers.pop(peer.token, None) is None:
+            return
+        self.hellos = {k: p for k, p in self.hellos.items() if p is not peer}
+        if self.broadcaster is not None:
+            self.broadcaster.remove(peer)
+        self.engine.remove_player(peer.pid)
+        print(f"[SERVER] Player {peer.pid} {why}", flush=True)
+
+    async def reap(self):
+        # there is no connection to close: a client that goes quiet is gone
+        while True:
+            await asyncio.sleep(self.timeout / 4)
+            now = clock()
+            for peer in [p for p in self.peers.values() if now - p.last_heard > self.timeout]:
+                self.drop(peer, "timed out")
+
+
+async def serve_udp(engine, host, port, cache, broadcaster=None, link=None):
+    if broadcaster is not None:
+        engine.tick_listeners.append(broadcaster.on_tick)
+
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: UdpGameServer(engine, cache, broadcaster, link), local_addr=(host, port))
+    print(f"[SERVER] Listening on port {port} (udp)...", flush=True)
+
+    tasks = [asyncio.create_task(engine.run_game_async()), asyncio.create_task(server.reap())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        transport.close()
+
+
+def main_udp(engine, host, port, cache, broadcaster=None, link=None):
+    asyncio.run(serve_udp(engine, host, port, cache, broadcaster, link))
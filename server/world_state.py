@@ -0,0 +1,27 @@
+class WorldSnapshot:
+    # Immutable view of one finished tick. The tick thread builds a new one
+    # after every update and swaps it in with a single assignment, so readers
+    # on other threads never see a half-updated world and never block the
+    # simulation. Nothing here may be mutated after construction.
+    def __init__(self, tick, players, npcs, input_acks=None):
+        self.tick = tick
+        self.players = players      # {id: (x, y, score)}
+        self.input_acks = input_acks or {}     # {id: (input seq, client tick)}
+        self._npcs = npcs           # list of (x, y), or a frozen NPCStore copy
+        self._npc_positions = None
+
+    def npc_positions(self):
+        # an NPCStore copy is only turned into tuples if someone asks
+        positions = self._npc_positions
+        if positions is None:
+            npcs = self._npcs
+            positions = npcs if isinstance(npcs, list) else npcs.positions()
+            self._npc_positions = positions
+        return positions
+
+    def state(self):
+        return {
+            "players": self.players,
+            "npcs": self.npc_positions(),
+            "tick": self.tick,
+        }